@@ -1,10 +1,59 @@
 import os
+from enum import Enum
 from pydantic import BaseSettings
 
 
+class AssignStrategyEnum(str, Enum):
+    greedy = 'greedy'
+    knapsack = 'knapsack'
+
+
+class AssignObjectiveEnum(str, Enum):
+    count = 'count'
+    weight = 'weight'
+
+
 class Settings(BaseSettings):
 
     database_url: str = ""
+    # serve the routes on an async engine (aiomysql) instead of the threadpool
+    database_async: bool = False
+
+    # connection pool (per process), size it against the threadpool
+    pool_size: int = 5
+    pool_max_overflow: int = 10
+    pool_timeout: float = 30.0
+    # below the MySQL wait_timeout, so idle connections are not dropped
+    # by the server
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = False
+
+    # order selection for a delivery (see utils/selection.py)
+    assign_strategy: AssignStrategyEnum = AssignStrategyEnum.knapsack
+    assign_objective: AssignObjectiveEnum = AssignObjectiveEnum.count
+    knapsack_max_candidates: int = 64
+    knapsack_time_budget: float = 0.02
+
+    # items per transaction of the NDJSON ingest (see ingest.py)
+    ingest_chunk_size: int = 1000
+
+    # process-local index of the pending orders (see db/pending.py)
+    pending_index: bool = True
+    pending_index_ttl: float = 60.0
+
+    # process-local index of the couriers by region (see db/regions.py)
+    region_index: bool = True
+    region_index_ttl: float = 60.0
+
+    # process-local cache of the courier profiles (see db/courier_cache.py)
+    courier_cache: bool = True
+    courier_cache_size: int = 10000
+    courier_cache_ttl: float = 30.0
+
+    # background assignment to the idle couriers (see db/auto_dispatch.py)
+    auto_dispatch: bool = False
+    auto_dispatch_interval: float = 1.0
+    auto_dispatch_batch_size: int = 100
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,118 @@
+"""
+Background dispatcher of this process
+
+With settings.auto_dispatch an asyncio task assigns the pending orders to
+the idle couriers every settings.auto_dispatch_interval seconds (see
+assign_idle_couriers), at most settings.auto_dispatch_batch_size couriers
+per pass. The next pass goes on from the last courier of the previous
+one, so every idle courier is visited however many of them there are.
+Each worker of the API runs a dispatcher of its own; they skip the rows
+locked by one another and by the requests.
+
+The dispatch lag is the time from a commit of new orders in this process
+till the end of the first sweep over all the idle couriers started after
+it, i.e. the longest an order may wait for the dispatcher, however many
+passes a sweep takes.
+"""
+from typing import Optional
+from time import monotonic
+import asyncio
+import logging
+
+from config import settings
+from .orders import assign_idle_couriers, dispatch_lag
+from .unit_of_work import run_in_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+class AutoDispatcher:
+
+    def __init__(self):
+        self._task = None
+        self.passes = 0
+        # passes over all the idle couriers
+        self.sweeps = 0
+        self.failures = 0
+        # passes which took longer than the interval
+        self.overruns = 0
+        self.last_pass = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, interval: float, batch_size: int):
+        if not self.running:
+            self._task = asyncio.get_event_loop().create_task(
+                self._run(interval, batch_size))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def dispatch(self, after: int = 0, batch_size: int = 100) -> Optional[dict]:
+        """ A single pass, returns its metrics or None if it has failed """
+        started = monotonic()
+        try:
+            metrics = await run_in_unit_of_work(assign_idle_couriers, after, batch_size)
+        except Exception:
+            self.failures += 1
+            logger.exception('Dispatch pass failed')
+            return None
+        self.passes += 1
+        self.last_pass = dict(metrics, duration=monotonic() - started)
+        return metrics
+
+    async def _run(self, interval: float, batch_size: int):
+        after = 0
+        since = dispatch_lag.begin()
+        next_at = monotonic()
+        try:
+            while True:
+                metrics = await self.dispatch(after, batch_size)
+                if metrics is not None:
+                    after = metrics['last_courier_id']
+                    # every idle courier has been visited since the sweep
+                    # began, so have the orders posted before it
+                    if not after:
+                        self.sweeps += 1
+                        dispatch_lag.done(since)
+                        since = dispatch_lag.begin()
+                # a fixed rate, unless a pass takes longer than the interval
+                next_at += interval
+                delay = next_at - monotonic()
+                if delay < 0:
+                    self.overruns += 1
+                    next_at, delay = monotonic(), 0
+                await asyncio.sleep(delay)
+        finally:
+            # the orders of the unfinished sweep are left to the next run
+            dispatch_lag.failed(since)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.auto_dispatch,
+            "running": self.running,
+            "interval": settings.auto_dispatch_interval,
+            "batch_size": settings.auto_dispatch_batch_size,
+            "passes": self.passes,
+            "sweeps": self.sweeps,
+            "failures": self.failures,
+            "overruns": self.overruns,
+            "last_pass": self.last_pass,
+            "lag": dispatch_lag.stats(),
+        }
+
+
+auto_dispatcher = AutoDispatcher()
+
+
+def get_auto_dispatch_stats() -> dict:
+    return auto_dispatcher.stats()
@@ -0,0 +1,72 @@
+"""
+Duplicate-tolerant bulk insert
+
+The rows are inserted in chunks with INSERT IGNORE, so the database itself
+skips the existing keys, and there is no window between a check and the
+insert. The number of inserted rows tells which chunks are entirely new
+(the usual case of a fresh upload) or entirely known. Only a mixed chunk
+is rolled back to its savepoint, and its existing keys are looked up
+before the rest is inserted again.
+"""
+from typing import List
+
+from sqlalchemy import select
+
+# rows per INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+def insert_ignore(table):
+    return table.insert().prefix_with(
+        'IGNORE', dialect='mysql'
+    ).prefix_with(
+        'OR IGNORE', dialect='sqlite'
+    )
+
+
+def insert_new_rows(connection, table, key: str, rows: List[dict]) -> List[int]:
+    """ Insert the rows with keys not existing yet, return these keys
+
+    A key repeated within the rows is inserted (and returned) once.
+    """
+    seen = set()
+    unique = []
+    for row in rows:
+        if row[key] not in seen:
+            seen.add(row[key])
+            unique.append(row)
+    rows = unique
+
+    statement = insert_ignore(table)
+    new_keys = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        new_keys += _insert_chunk(connection, table, statement, key,
+                                  rows[start:start + INSERT_CHUNK_SIZE])
+    return new_keys
+
+
+def _insert_chunk(connection, table, statement, key: str,
+                  rows: List[dict]) -> List[int]:
+    if not rows:
+        return []
+    if len(rows) == 1:
+        inserted = connection.execute(statement, rows).rowcount
+        return [rows[0][key]] if inserted else []
+
+    savepoint = connection.begin_nested()
+    inserted = connection.execute(statement, rows).rowcount
+    if inserted == len(rows):
+        savepoint.commit()
+        return [row[key] for row in rows]
+    if inserted == 0:
+        savepoint.commit()
+        return []
+    savepoint.rollback()
+
+    result = connection.execute(
+        select([table.c[key]]).where(table.c[key].in_([row[key] for row in rows])))
+    existing = set(row[0] for row in result)
+    # the rest might have been inserted concurrently meanwhile, so it is
+    # checked the same way
+    return _insert_chunk(connection, table, statement, key,
+                         [row for row in rows if row[key] not in existing])
@@ -0,0 +1,62 @@
+"""
+The courier profile cache of this process (see utils/cache.py)
+
+GET /couriers/{id} is served from it for up to settings.courier_cache_ttl
+seconds, which also bounds how long a change made by another process may
+go unnoticed. The changes made by this one invalidate the courier right
+away and once more after the commit, so a reader which has fetched the old
+row in between cannot leave it cached. assign_orders reads the version of
+the locked courier row and takes the cached profile only if it matches.
+"""
+from typing import List, Optional
+
+from config import settings
+from sqlalchemy import select
+from utils.cache import LRUCache
+from .schema import tbl_couriers
+from .db import after_commit
+
+courier_cache = LRUCache(settings.courier_cache_size, settings.courier_cache_ttl)
+
+PROFILE_COLUMNS = [
+    tbl_couriers.c.courier_id,
+    tbl_couriers.c.courier_type,
+    tbl_couriers.c.regions,
+    tbl_couriers.c.working_hours,
+    tbl_couriers.c.earnings,
+    tbl_couriers.c.version
+]
+
+
+def get_courier_profile(connection, courier_id: int,
+                        version: Optional[int] = None) -> Optional[dict]:
+    """ The courier row (stored form), None if there is no such courier
+
+    A cached profile of another version than the given one is reread.
+    """
+    if settings.courier_cache:
+        profile = courier_cache.get(courier_id)
+        if profile is not None and (version is None or profile['version'] == version):
+            return dict(profile)
+        token = courier_cache.token()
+
+    row = connection.execute(
+        select(PROFILE_COLUMNS).where(tbl_couriers.c.courier_id == courier_id)
+    ).fetchone()
+    if row is None:
+        return None
+    profile = dict(row)
+    if settings.courier_cache:
+        courier_cache.put(courier_id, profile, token)
+    return dict(profile)
+
+
+def invalidate_couriers(connection, courier_ids: List[int]):
+    if not settings.courier_cache or not courier_ids:
+        return
+    courier_cache.invalidate(courier_ids)
+    after_commit(connection, lambda: courier_cache.invalidate(courier_ids))
+
+
+def get_courier_cache_stats() -> dict:
+    return dict(courier_cache.stats(), enabled=settings.courier_cache)
@@ -1,179 +1,177 @@
 from typing import List
 from datetime import datetime
-from decimal import Decimal
 
-from schemas.couriers import CourierItem, CourierTypeEnum
+from schemas.couriers import CourierTypeEnum
 from schemas.orders import OrderStatusEnum
 from sqlalchemy import select
-from sqlalchemy.sql import func
-from utils.time import can_be_delivered_in_time
+from utils.selection import to_centikilos
+from utils.time import IntervalSet, format_hours, load_hours
 from .schema import (
+    hours_values,
     tbl_couriers,
     tbl_orders,
     tbl_deliveries,
     tbl_deliveries_orders
 )
-from .db import engine
+from .queries import select_courier_assigned_orders
+from .bulk import insert_new_rows
+from .orders import complete_delivery, courier_working_hours
+from .courier_cache import get_courier_profile, invalidate_couriers
+from .db import after_commit
+from .pending import pending_index_changes, pending_order
+from .regions import save_courier_regions
 
 
-def save_posted_couriers(couriers: List[CourierItem]):
+def save_posted_couriers(connection, couriers: List[dict]):
+    """ Insert the validated courier rows, return the ids of the new ones """
     if not couriers:
         return []
 
-    posted_ids = set([e.courier_id for e in couriers])
+    new_ids = insert_new_rows(connection, tbl_couriers, 'courier_id', [
+        dict(e, **hours_values('working_hours', e['working_hours']))
+        for e in couriers
+    ])
+    # the first one of a repeated id is the one inserted
+    created = set(new_ids)
+    regions = []
+    for e in couriers:
+        if e['courier_id'] in created:
+            created.discard(e['courier_id'])
+            regions.append((e['courier_id'], e['regions']))
+    save_courier_regions(connection, regions)
+    # in case a courier of the same id has been cached before
+    invalidate_couriers(connection, new_ids)
+    return new_ids
+
+
+def unfit_orders(orders, courier_info, now: datetime) -> list:
+    """ The assigned orders the courier can no longer deliver
+
+    orders are sorted by weight, so the lightest ones are kept when the
+    capacity shrinks. The slot masks rule out most of the orders outside
+    of the courier hours before the exact check parses their hours.
+    """
+    regions = set(courier_info['regions'])
+    capacity = to_centikilos(CourierTypeEnum.max_weight(courier_info['courier_type']))
+    working_hours = courier_working_hours(courier_info, now)
+    slots_am, slots_pm = working_hours.slot_masks()
+    total = 0
+    unfit = []
+    for order in orders:
+        weight = to_centikilos(order['weight'])
+        if (order['region'] in regions and total + weight <= capacity and
+                (order['slots_am'] & slots_am or order['slots_pm'] & slots_pm) and
+                working_hours.overlaps(IntervalSet(order['delivery_hours']))):
+            total += weight
+        else:
+            unfit.append(order)
+    return unfit
+
+
+def update_courier(connection, courier_id: int, data):
+    s = select(
+        [
+            tbl_couriers.c.courier_type,
+            tbl_couriers.c.regions,
+            tbl_couriers.c.working_hours
+        ]
+    ).where(
+        tbl_couriers.c.courier_id == courier_id
+    )
+    result = connection.execute(s)
+    row = result.fetchone()
+
+    if row is None:
+        return None
+
+    courier_info = dict(row)
+    courier_info['working_hours'] = load_hours(row['working_hours'])
+    if not data:
+        return courier_info
 
-    with engine.connect() as connection:
-        # get existing courier ids
-        s = select(
-            [tbl_couriers.c.courier_id]
-        ).where(
-            tbl_couriers.c.courier_id.in_(posted_ids)
-        )
-        result = connection.execute(s)
-        existing_ids = set([row[0] for row in result])
-
-        # get posted but not existing ids
-        new_ids = list(posted_ids - existing_ids)
-
-        data_to_db = [e.dict() for e in couriers if e.courier_id in new_ids]
-        if data_to_db:
-            connection.execute(tbl_couriers.insert(), data_to_db)
-            return new_ids
-    return []
-
-
-def update_courier(courier_id: int, data):
-    with engine.connect() as connection:
-        s = select(
-            [
-                tbl_couriers.c.courier_type,
-                tbl_couriers.c.regions,
-                tbl_couriers.c.working_hours
-            ]
+    # only a change of these may leave assigned orders unfit
+    changed = any(courier_info[k] != v for k, v in data.items())
+    courier_info.update(data)
+    connection.execute(
+        tbl_couriers.update().values(
+            dict(courier_info,
+                 version=tbl_couriers.c.version + 1,
+                 **hours_values('working_hours', courier_info['working_hours']))
         ).where(
             tbl_couriers.c.courier_id == courier_id
         )
-        result = connection.execute(s)
-        row = result.fetchone()
-
-        if row is None:
-            return None
-
-        courier_info = dict(row)
-
-        if data:
-            for k, v in data.items():
-                courier_info[k] = v
-            connection.execute(
-                tbl_couriers.update().values(**courier_info).where(
-                    tbl_couriers.c.courier_id == courier_id
-                )
-            )
-
-            # TODO: remove assigned orders (if any) that got unfit
-            #       upon courier info alteration
-
-            # check if the uncompleted delivery exists for the courier
-            ds = select(
-                [tbl_deliveries]
-            ).where(
-                (tbl_deliveries.c.courier_id == courier_id) &
-                (tbl_deliveries.c.status == OrderStatusEnum.assigned)
-            )
-            result = connection.execute(ds)
-            row = result.fetchone()
-
-            # if the uncompleted delivery exists, return all assigned,
-            # but not completed orders
-            if row:
-                delivery_id = row['delivery_id']
-                us = select(
-                    [tbl_orders]
-                ).where(
-                    (tbl_orders.c.status == OrderStatusEnum.assigned) &
-                    (tbl_deliveries.c.delivery_id == delivery_id) &
-                    (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
-                    (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id)
-                ).order_by(tbl_orders.c.weight)
-                result = connection.execute(us)
-                rows = result.fetchall()
-                if rows:
-                    orders_good = []
-                    orders_bad = []
-                    total_weight = Decimal('0.0')
-                    assign_time = datetime.now()
-                    for order in rows:
-                        if order['region'] not in courier_info['regions']:
-                            orders_bad.append(order)
-                        elif order['weight'] > CourierTypeEnum.max_weight(courier_info['courier_type']):
-                            orders_bad.append(order)
-                        elif not can_be_delivered_in_time(assign_time.strftime('%H:%M'),
-                            courier_info['working_hours'], order['delivery_hours']):
-                            orders_bad.append(order)
-                        elif total_weight + order['weight'] > CourierTypeEnum.max_weight(courier_info['courier_type']):
-                            orders_bad.append(order)
-                        else:
-                            orders_good.append(order)
-
-                    # release unfit orders
-                    if orders_bad:
-                        bad_ids = [e['order_id'] for e in orders_bad]
-                        connection.execute(
-                            tbl_orders.update().values(
-                                status=OrderStatusEnum.pending,
-                                completed_at=None
-                            ).where(tbl_orders.c.order_id.in_(bad_ids))
-                        )
-                        connection.execute(
-                            tbl_deliveries_orders.delete(
-                            ).where(
-                                (tbl_deliveries_orders.c.order_id.in_(bad_ids)) &
-                                (tbl_deliveries_orders.c.delivery_id == delivery_id)
-                            )
-                        )
-
-                        # check if the delivery empty (both assigned and
-                        # completed orders are absent) and delete it
-                        eds = select(
-                            [tbl_deliveries_orders]
-                        ).where(
-                            tbl_deliveries_orders.c.delivery_id == delivery_id
-                        )
-                        result = connection.execute(eds)
-                        rows = result.fetchall()
-                        if not rows:
-                            connection.execute(
-                                tbl_deliveries.delete(
-                                ).where(
-                                    tbl_deliveries.c.delivery_id == delivery_id
-                                )
-                            )
-    return courier_info
+    )
+    invalidate_couriers(connection, [courier_id])
+    if 'regions' in data and set(data['regions']) != set(row['regions']):
+        save_courier_regions(connection, [(courier_id, data['regions'])],
+                             replace=True)
+    if not changed:
+        return courier_info
 
+    # assigned orders of the uncompleted delivery (if any), locked, so that
+    # none of them gets completed while released; the courier row is
+    # locked by the update above already (see lock_couriers)
+    result = connection.execute(
+        select_courier_assigned_orders(courier_id).with_for_update())
+    orders = result.fetchall()
+    orders_bad = unfit_orders(orders, courier_info, datetime.now())
+    if not orders_bad:
+        return courier_info
 
-def get_courier_info(courier_id: int):
-    with engine.connect() as connection:
-        s = select(
-            [tbl_couriers]
+    # release unfit orders
+    delivery_id = orders[0]['delivery_id']
+    bad_ids = [e['order_id'] for e in orders_bad]
+    connection.execute(
+        tbl_orders.update().values(
+            status=OrderStatusEnum.pending,
+            completed_at=None
+        ).where(tbl_orders.c.order_id.in_(bad_ids))
+    )
+    connection.execute(
+        tbl_deliveries_orders.delete(
         ).where(
-            tbl_couriers.c.courier_id == courier_id
+            (tbl_deliveries_orders.c.order_id.in_(bad_ids)) &
+            (tbl_deliveries_orders.c.delivery_id == delivery_id)
         )
-        result = connection.execute(s)
-        row = result.fetchone()
-        if row is None:
-            return None
-        courier_info = dict(row)
-
-        # calculate earnings based on completed deliveries
+    )
+    connection.execute(
+        tbl_deliveries.update().values(
+            total_orders=tbl_deliveries.c.total_orders - len(bad_ids),
+            remaining_orders=tbl_deliveries.c.remaining_orders - len(bad_ids)
+        ).where(tbl_deliveries.c.delivery_id == delivery_id)
+    )
+
+    # with no orders left to complete the delivery is either empty (then
+    # it is deleted) or done
+    if len(orders_bad) == len(orders):
         result = connection.execute(
-            select(
-                func.sum(tbl_deliveries.c.coeff)
+            tbl_deliveries.delete(
             ).where(
-                (tbl_deliveries.c.courier_id == courier_id) &
-                (tbl_deliveries.c.status == OrderStatusEnum.completed)
+                (tbl_deliveries.c.delivery_id == delivery_id) &
+                (tbl_deliveries.c.total_orders == 0)
             )
-        ).scalar()
-        courier_info['earnings'] = 0
-        if result:
-            courier_info['earnings'] = result * 500
-        return courier_info
+        )
+        if not result.rowcount:
+            complete_delivery(connection, delivery_id, courier_id,
+                              orders[0]['coeff'])
+
+    # released orders are pending again
+    index = pending_index_changes()
+    if index is not None:
+        after_commit(connection, lambda: index.add(
+            pending_order(row) for row in orders_bad))
+    return courier_info
+
+
+def get_courier_info(connection, courier_id: int):
+    profile = get_courier_profile(connection, courier_id)
+    if profile is None:
+        return None
+    return {
+        "courier_id": profile['courier_id'],
+        "courier_type": profile['courier_type'],
+        "regions": profile['regions'],
+        "working_hours": format_hours(profile['working_hours']),
+        # kept up to date by complete_order, see db/reconcile.py
+        "earnings": profile['earnings']
+    }
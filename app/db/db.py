@@ -1,4 +1,78 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from config import settings
+from .pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool, pool_stats
 
-engine = create_engine(settings.database_url)
+# async drivers by backend, for settings.database_async
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+AFTER_COMMIT = 'after_commit'
+
+url = make_url(settings.database_url)
+
+engine_options = {}
+if url.get_backend_name() == 'mysql':
+    # Under READ COMMITTED InnoDB releases locks of the scanned rows which
+    # do not match the WHERE clause, so the SKIP LOCKED candidate scans keep
+    # locked only the orders a courier may actually take.
+    engine_options['isolation_level'] = 'READ COMMITTED'
+
+if url.get_backend_name() == 'sqlite':
+    # a unit of work passes its connection between threadpool threads
+    engine_options['connect_args'] = {'check_same_thread': False}
+
+# SQLite keeps the pools SQLAlchemy picks for it (poolclass None)
+poolclass = async_poolclass = None
+if url.get_backend_name() != 'sqlite':
+    poolclass = InstrumentedQueuePool
+    async_poolclass = InstrumentedAsyncQueuePool
+    engine_options.update({
+        'pool_size': settings.pool_size,
+        'max_overflow': settings.pool_max_overflow,
+        'pool_timeout': settings.pool_timeout,
+        'pool_recycle': settings.pool_recycle,
+        'pool_pre_ping': settings.pool_pre_ping,
+    })
+
+engine = create_engine(url, poolclass=poolclass, **engine_options)
+
+async_engine = None
+if settings.database_async:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    async_engine = create_async_engine(
+        url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]),
+        poolclass=async_poolclass,
+        **engine_options
+    )
+
+
+def after_commit(connection, callback):
+    """ Call back once the current transaction of the connection commits """
+    connection.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+def run_in_transaction(fn, *args, **kwargs):
+    """ fn(connection, *args, **kwargs) in a transaction of its own
+
+    For scripts and tests, the routes use a unit of work (unit_of_work.py)
+    """
+    with engine.connect() as connection:
+        try:
+            with connection.begin():
+                result = fn(connection, *args, **kwargs)
+        finally:
+            callbacks = connection.info.pop(AFTER_COMMIT, [])
+    for callback in callbacks:
+        callback()
+    return result
+
+
+def get_pool_stats() -> dict:
+    """ Statistics of the pools of this process by engine """
+    stats = {"sync": pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = pool_stats(async_engine.sync_engine.pool)
+    return stats
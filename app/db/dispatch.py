@@ -0,0 +1,143 @@
+"""
+Offline global dispatch job
+
+    python3 dispatch.py                 run a single dispatch pass
+    python3 dispatch.py --interval 5    run a pass every 5 seconds
+
+Takes a snapshot of the idle couriers and the pending orders, solves the
+global assignment (see utils/dispatch.py) and writes the deliveries in bulk
+through the same tables as assign_orders.
+"""
+if __name__ == "__main__":
+    import sys
+    # ahead of this directory, where db.py would shadow the db package
+    sys.path.insert(0, "..")
+
+import argparse
+import logging
+from datetime import datetime
+from time import perf_counter, sleep
+
+from sqlalchemy import select
+
+from schemas.couriers import CourierTypeEnum
+from schemas.orders import OrderStatusEnum
+from utils.dispatch import DispatchCourier, DispatchOrder, solve
+from utils.selection import to_centikilos
+from utils.time import IntervalSet
+from db.schema import tbl_couriers, tbl_orders, tbl_deliveries
+from db.orders import courier_working_hours, create_deliveries
+from db.queries import select_region_couriers
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_pending_orders(connection) -> dict:
+    """ A single dispatch pass, returns the pass metrics """
+    started = perf_counter()
+    assign_time = datetime.now()
+
+    busy = select(
+        [tbl_deliveries.c.courier_id]
+    ).where(
+        tbl_deliveries.c.status == OrderStatusEnum.assigned
+    )
+    # only the couriers of the regions with pending orders, found by the
+    # courier_regions index
+    serving = select_region_couriers(
+        select([tbl_orders.c.region]).where(
+            tbl_orders.c.status == OrderStatusEnum.pending).distinct())
+    # couriers being served by assign_orders right now are left to it
+    result = connection.execute(
+        select(
+            [tbl_couriers]
+        ).where(
+            tbl_couriers.c.courier_id.in_(serving) &
+            tbl_couriers.c.courier_id.notin_(busy)
+        ).with_for_update(skip_locked=True)
+    )
+    couriers = {}
+    for row in result:
+        working_hours = courier_working_hours(row, assign_time)
+        if working_hours:
+            couriers[row['courier_id']] = (dict(row), DispatchCourier(
+                row['courier_id'],
+                to_centikilos(CourierTypeEnum.max_weight(row['courier_type'])),
+                row['regions'],
+                working_hours
+            ))
+
+    orders = []
+    if couriers:
+        result = connection.execute(
+            select(
+                [
+                    tbl_orders.c.order_id,
+                    tbl_orders.c.weight,
+                    tbl_orders.c.region,
+                    tbl_orders.c.delivery_hours,
+                    tbl_orders.c.slots_am,
+                    tbl_orders.c.slots_pm
+                ]
+            ).where(
+                tbl_orders.c.status == OrderStatusEnum.pending
+            ).with_for_update(skip_locked=True)
+        )
+        orders = [
+            DispatchOrder(
+                row['order_id'],
+                to_centikilos(row['weight']),
+                row['region'],
+                IntervalSet(row['delivery_hours']),
+                (row['slots_am'], row['slots_pm'])
+            )
+            for row in result
+        ]
+    loaded = perf_counter()
+
+    assignment = solve([c for _, c in couriers.values()], orders)
+    solved = perf_counter()
+
+    deliveries = [(couriers[courier_id][0], order_ids)
+                  for courier_id, order_ids in assignment.items()]
+    if deliveries:
+        create_deliveries(connection, deliveries, assign_time)
+    written = perf_counter()
+
+    return {
+        "idle_couriers": len(couriers),
+        "pending_orders": len(orders),
+        "deliveries": len(deliveries),
+        "assigned_orders": sum(len(x) for x in assignment.values()),
+        "load_time": loaded - started,
+        "solve_time": solved - loaded,
+        "write_time": written - solved,
+        "total_time": written - started,
+    }
+
+
+def run(engine, interval: float = 0):
+    while True:
+        with engine.begin() as connection:
+            metrics = dispatch_pending_orders(connection)
+        logger.info(
+            'dispatched %(assigned_orders)d of %(pending_orders)d orders to '
+            '%(deliveries)d of %(idle_couriers)d couriers in %(total_time).3fs '
+            '(load %(load_time).3fs, solve %(solve_time).3fs, '
+            'write %(write_time).3fs)', metrics)
+        if not interval:
+            break
+        sleep(interval)
+
+
+if __name__ == "__main__":
+    from db.db import engine
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    parser = argparse.ArgumentParser(description='Yapi global dispatch')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='repeat every INTERVAL seconds')
+    args = parser.parse_args()
+    try:
+        run(engine, args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,260 @@
+"""
+Versioned schema migrations
+
+    python3 migrations.py [upgrade]  apply pending migrations to a live database
+    python3 migrations.py init       drop and recreate all tables (data loss!)
+    python3 migrations.py explain    log query plans of the hot queries
+
+Every migration is applied in its own transaction and bumps the version
+stored in the schema_version table. Migrations check the actual database
+state before altering it, so they are safe to rerun against a database
+which was (partially) created by schema.py already.
+"""
+if __name__ == "__main__":
+    import sys
+    # ahead of this directory, where db.py would shadow the db package
+    sys.path.insert(0, "..")
+
+import argparse
+import logging
+
+from sqlalchemy import bindparam, create_engine, inspect, select
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+
+from config import settings
+from schemas.orders import OrderStatusEnum
+from utils.time import IntervalSet, TimeInterval
+from db.schema import (
+    metadata,
+    hours_values,
+    window_values,
+    tbl_couriers,
+    tbl_courier_regions,
+    tbl_orders,
+    tbl_order_windows,
+    tbl_deliveries,
+    tbl_deliveries_orders,
+    tbl_schema_version
+)
+from db.queries import (
+    select_courier_with_delivery,
+    select_open_deliveries,
+    select_assigned_orders,
+    select_courier_assigned_orders,
+    select_candidate_orders,
+    select_fitting_orders,
+    select_courier_order,
+    select_region_couriers,
+    select_idle_couriers
+)
+from db.reconcile import reconcile_earnings
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def add_column(connection, table, name: str):
+    """ Add the column as declared in schema.py unless it exists """
+    existing = [c['name'] for c in inspect(connection).get_columns(table.name)]
+    if name in existing:
+        return
+    ddl = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+
+
+def create_index(connection, index):
+    """ Create the index as declared in schema.py unless it exists """
+    existing = [i['name'] for i in inspect(connection).get_indexes(index.table.name)]
+    if index.name not in existing:
+        index.create(connection)
+
+
+def table_indexes(table, *names):
+    return [i for i in table.indexes if i.name in names]
+
+
+def convert_hours(connection, table, key: str, column: str):
+    """ Rewrite hours into minute pairs and fill the slot bitmasks """
+    rows = connection.execute(select([table.c[key], table.c[column]])).fetchall()
+    statement = table.update().where(table.c[key] == bindparam('key_'))
+    for i in range(0, len(rows), BATCH_SIZE):
+        values = []
+        for row in rows[i:i + BATCH_SIZE]:
+            hours = [TimeInterval.parse(x) if isinstance(x, str) else x
+                     for x in row[column]]
+            values.append(dict(hours_values(column, hours), key_=row[key]))
+        connection.execute(statement, values)
+
+
+def hours_as_minutes(connection):
+    """ Hours stored as minute pairs along with slot bitmasks """
+    for table in (tbl_couriers, tbl_orders):
+        add_column(connection, table, 'slots_am')
+        add_column(connection, table, 'slots_pm')
+    convert_hours(connection, tbl_couriers, 'courier_id', 'working_hours')
+    convert_hours(connection, tbl_orders, 'order_id', 'delivery_hours')
+
+
+def hot_path_indexes(connection):
+    """ Secondary indexes for the hot queries """
+    for index in (
+        table_indexes(tbl_orders, 'ix_orders_status_region_weight') +
+        table_indexes(tbl_deliveries, 'ix_deliveries_courier_status') +
+        table_indexes(tbl_deliveries_orders, 'ix_deliveries_orders_delivery',
+                      'ix_deliveries_orders_order')
+    ):
+        create_index(connection, index)
+
+
+def courier_earnings(connection):
+    """ Courier earnings and completed deliveries stored on the courier """
+    add_column(connection, tbl_couriers, 'earnings')
+    add_column(connection, tbl_couriers, 'completed_deliveries')
+    reconcile_earnings(connection, fix=True)
+
+
+def courier_version(connection):
+    """ Courier profile version checking the cached profiles """
+    add_column(connection, tbl_couriers, 'version')
+
+
+def delivery_counters(connection):
+    """ Total and not completed order counters of the deliveries """
+    add_column(connection, tbl_deliveries, 'total_orders')
+    add_column(connection, tbl_deliveries, 'remaining_orders')
+    links = tbl_deliveries_orders
+    total = select(
+        [func.count()]
+    ).where(
+        links.c.delivery_id == tbl_deliveries.c.delivery_id
+    ).scalar_subquery()
+    remaining = select(
+        [func.count()]
+    ).where(
+        (links.c.delivery_id == tbl_deliveries.c.delivery_id) &
+        (tbl_orders.c.order_id == links.c.order_id) &
+        (tbl_orders.c.status == OrderStatusEnum.assigned)
+    ).scalar_subquery()
+    connection.execute(
+        tbl_deliveries.update().values(total_orders=total, remaining_orders=remaining))
+
+
+def courier_regions(connection):
+    """ Courier regions table searchable by region """
+    tbl_courier_regions.create(connection, checkfirst=True)
+    connection.execute(tbl_courier_regions.delete())
+    rows = connection.execute(
+        select([tbl_couriers.c.courier_id, tbl_couriers.c.regions])).fetchall()
+    values = [{"courier_id": row['courier_id'], "region": region}
+              for row in rows for region in sorted(set(row['regions']))]
+    for i in range(0, len(values), BATCH_SIZE):
+        connection.execute(tbl_courier_regions.insert(), values[i:i + BATCH_SIZE])
+
+
+def order_windows(connection):
+    """ Delivery windows table searchable by minutes """
+    tbl_order_windows.create(connection, checkfirst=True)
+    connection.execute(tbl_order_windows.delete())
+    rows = connection.execute(
+        select([tbl_orders.c.order_id, tbl_orders.c.delivery_hours])).fetchall()
+    values = [window for row in rows
+              for window in window_values(row['order_id'], row['delivery_hours'])]
+    for i in range(0, len(values), BATCH_SIZE):
+        connection.execute(tbl_order_windows.insert(), values[i:i + BATCH_SIZE])
+
+
+# append only: the position in the list is the schema version
+MIGRATIONS = [
+    hours_as_minutes,
+    hot_path_indexes,
+    courier_earnings,
+    courier_version,
+    delivery_counters,
+    courier_regions,
+    order_windows,
+]
+
+
+def get_version(connection) -> int:
+    version = connection.execute(select([tbl_schema_version.c.version])).scalar()
+    return version or 0
+
+
+def set_version(connection, version: int):
+    connection.execute(tbl_schema_version.delete())
+    connection.execute(tbl_schema_version.insert(), [{"version": version}])
+
+
+def upgrade(engine):
+    with engine.begin() as connection:
+        tbl_schema_version.create(connection, checkfirst=True)
+        current = get_version(connection)
+
+    for version, migration in enumerate(MIGRATIONS, 1):
+        if version <= current:
+            continue
+        logger.info('Applying migration %d: %s', version, migration.__doc__.strip())
+        with engine.begin() as connection:
+            migration(connection)
+            set_version(connection, version)
+    logger.info('Schema version: %d', max(current, len(MIGRATIONS)))
+
+
+def init(engine):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        set_version(connection, len(MIGRATIONS))
+    logger.info('Schema version: %d', len(MIGRATIONS))
+
+
+def hot_queries():
+    return [
+        ('candidate orders', select_candidate_orders(
+            [1, 2, 3], 50, IntervalSet([(540, 1080)]))),
+        ('fitting orders', select_fitting_orders(
+            [1, 2, 3], 50, IntervalSet([(540, 1080)]), 65)),
+        ('courier with delivery', select_courier_with_delivery(1)),
+        ('open delivery', select_open_deliveries([1])),
+        ('assigned orders', select_assigned_orders([1], [tbl_orders.c.order_id])),
+        ('courier assigned orders', select_courier_assigned_orders(1)),
+        ('courier order', select_courier_order(1, 1)),
+        ('region couriers', select_region_couriers([1, 2, 3])),
+        ('idle couriers', select_idle_couriers(0, 100)),
+    ]
+
+
+def explain(engine) -> int:
+    """ Log the query plans of the hot queries, return full scans count """
+    full_scans = 0
+    with engine.connect() as connection:
+        sqlite = connection.dialect.name == 'sqlite'
+        prefix = 'EXPLAIN QUERY PLAN' if sqlite else 'EXPLAIN'
+        for name, query in hot_queries():
+            sql = str(query.compile(dialect=connection.dialect,
+                                    compile_kwargs={"literal_binds": True}))
+            logger.info('%s:', name)
+            for row in connection.exec_driver_sql(f'{prefix} {sql}'):
+                plan = dict(row._mapping)
+                if sqlite:
+                    scan = plan['detail'].startswith('SCAN')
+                else:
+                    scan = plan['type'] == 'ALL'
+                full_scans += scan
+                (logger.warning if scan else logger.info)('    %s', plan)
+    if full_scans:
+        logger.warning('Full table scans: %d (expected on empty or tiny '
+                       'tables only)', full_scans)
+    return full_scans
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Yapi schema migrations')
+    parser.add_argument('command', nargs='?', default='upgrade',
+                        choices=['upgrade', 'init', 'explain'])
+    args = parser.parse_args()
+    commands = {'upgrade': upgrade, 'init': init, 'explain': explain}
+    commands[args.command](create_engine(settings.database_url))
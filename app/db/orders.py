@@ -1,189 +1,590 @@
 from typing import List
+from collections import defaultdict
 from datetime import datetime
-from decimal import Decimal
+import heapq
 
-from schemas.orders import OrderItem, OrderStatusEnum
-from schemas.couriers import CourierTypeEnum
-from sqlalchemy import select
-from utils.time import can_be_delivered_in_time
+from config import settings
+from schemas.orders import OrderStatusEnum
+from schemas.couriers import BASE_EARNINGS, CourierTypeEnum
+from sqlalchemy import case, select
+from utils.lag import LagMeter
+from utils.pending import PendingOrder
+from utils.selection import candidates_needed, select_orders, to_centikilos
+from utils.time import IntervalSet, minute_of_day
 from .schema import (
+    hours_values,
+    window_values,
     tbl_couriers,
     tbl_orders,
+    tbl_order_windows,
     tbl_deliveries,
     tbl_deliveries_orders
 )
-from .db import engine
+from .queries import (
+    select_courier_with_delivery,
+    select_open_deliveries,
+    select_assigned_orders,
+    select_candidate_orders,
+    select_fitting_orders,
+    select_courier_order,
+    select_orders_with_delivery,
+    select_idle_couriers
+)
+from .bulk import insert_new_rows
+from .courier_cache import get_courier_profile, invalidate_couriers
+from .db import after_commit
+from .pending import get_pending_index, pending_index_changes
+
+# rounds of the index-based claim before falling back to the table scan
+CLAIM_ATTEMPTS = 3
+
+# orders posted to this process waiting for the background dispatcher
+# (see db/auto_dispatch.py)
+dispatch_lag = LagMeter()
 
 
-def save_posted_orders(orders: List[OrderItem]):
+def save_posted_orders(connection, orders: List[dict]):
+    """ Insert the validated order rows, return the ids of the new ones """
     if not orders:
         return []
 
-    posted_ids = set([e.order_id for e in orders])
+    new_ids = insert_new_rows(connection, tbl_orders, 'order_id', [
+        dict(e, **hours_values('delivery_hours', e['delivery_hours']))
+        for e in orders
+    ])
+    # the first one of a repeated id is the one inserted
+    created = set(new_ids)
+    new_orders = []
+    for e in orders:
+        if e['order_id'] in created:
+            created.discard(e['order_id'])
+            new_orders.append(e)
+    windows = [w for e in new_orders
+               for w in window_values(e['order_id'], e['delivery_hours'])]
+    if windows:
+        connection.execute(tbl_order_windows.insert(), windows)
 
-    with engine.connect() as connection:
-        # get existing order ids
-        s = select(
-            [tbl_orders.c.order_id]
-        ).where(
-            tbl_orders.c.order_id.in_(posted_ids)
-        )
-        result = connection.execute(s)
-        existing_ids = set([row[0] for row in result])
+    index = pending_index_changes()
+    if new_orders and index is not None:
+        entries = [PendingOrder(e['order_id'], e['weight'], e['region'],
+                                IntervalSet(e['delivery_hours']))
+                   for e in new_orders]
+        after_commit(connection, lambda: index.add(entries))
+    if new_orders and settings.auto_dispatch:
+        after_commit(connection, dispatch_lag.event)
+    return new_ids
 
-        # get posted but not existing ids
-        new_ids = list(posted_ids - existing_ids)
 
-        data_to_db = [e.dict() for e in orders if e.order_id in new_ids]
-        if data_to_db:
-            connection.execute(tbl_orders.insert(), data_to_db)
-            return new_ids
-    return []
+def completed_at(complete_time: str) -> str:
+    """ Storage form of the complete_time of a request """
+    moment = datetime.strptime(complete_time, "%Y-%m-%dT%H:%M:%S.%fZ")
+    return moment.isoformat(sep=' ', timespec='milliseconds')[:-1]
 
 
-def assign_orders(courier_id: int):
-    with engine.connect() as connection:
-        # check if courier_id exists and get courier info
-        cs = select(
-            [tbl_couriers]
-        ).where(
-            tbl_couriers.c.courier_id == courier_id
-        )
-        result = connection.execute(cs)
-        row = result.fetchone()
-        if row is None:
-            return None
-        courier_info = dict(row)
+def format_assignment(order_ids: List[int], assign_time: datetime):
+    return {"orders": list([{"id": x} for x in sorted(order_ids)]),
+            "assign_time": assign_time.isoformat(timespec='milliseconds')[:-1] + 'Z'}
+
+
+def courier_working_hours(courier_info, assign_time: datetime) -> IntervalSet:
+    """ The rest of the courier's working day """
+    return IntervalSet(
+        courier_info['working_hours']).clip(minute_of_day(assign_time))
 
-        # check if the uncompleted delivery exists for the courier
-        ds = select(
-            [tbl_deliveries]
+
+def choose_orders(courier_info, candidates) -> List[int]:
+    """ Ids of the orders to deliver out of the time-fitting candidates
+
+    The candidates are expected to be sorted by weight.
+    """
+    chosen = select_orders(
+        [to_centikilos(row['weight']) for row in candidates],
+        to_centikilos(CourierTypeEnum.max_weight(courier_info['courier_type']))
+    )
+    return [candidates[i]['order_id'] for i in chosen]
+
+
+def lock_pending_orders(connection, order_ids: List[int]) -> set:
+    """ Lock the chosen orders, return the ids which could not be locked
+
+    i.e. the ones not pending any more and the ones locked by concurrent
+    transactions, which are skipped instead of waited for. Only the chosen
+    rows get locked, so the rest of the candidates stay available to the
+    other couriers.
+    """
+    result = connection.execute(
+        select(
+            [tbl_orders.c.order_id]
         ).where(
-            (tbl_deliveries.c.courier_id == courier_id) &
-            (tbl_deliveries.c.status == OrderStatusEnum.assigned)
-        )
-        result = connection.execute(ds)
-        row = result.fetchone()
-
-        # if the uncompleted delivery exists, return all assigned,
-        #  but not completed order ids
-        if row:
-            us = select(
-                [tbl_orders.c.order_id]
-            ).where(
-                (tbl_orders.c.status == OrderStatusEnum.assigned) &
-                (tbl_deliveries.c.delivery_id == row['delivery_id']) &
-                (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
-                (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id)
+            (tbl_orders.c.order_id.in_(order_ids)) &
+            (tbl_orders.c.status == OrderStatusEnum.pending)
+        ).with_for_update(skip_locked=True)
+    )
+    return set(order_ids) - set(row[0] for row in result)
+
+
+def claim_indexed_orders(connection, index, courier_info,
+                         working_hours: IntervalSet):
+    """ Choose orders out of the pending index and confirm them in the db
+
+    The orders which turn out not to be pending (or to be claimed by a
+    concurrent transaction) are dropped from the index and the choice is
+    repeated without them. Returns None if the index has nothing to offer
+    or keeps missing, so the caller falls back to the table scan: the index
+    lacks the orders posted through other processes till it is resynced.
+    """
+    rejected = set()
+    for _ in range(CLAIM_ATTEMPTS):
+        candidates = [
+            order for order in index.candidates(
+                courier_info['regions'],
+                CourierTypeEnum.max_weight(courier_info['courier_type']),
+                working_hours
             )
-            result = connection.execute(us)
-            rows = [e['order_id'] for e in result.fetchall()]
-            return {"orders": list([{"id": x} for x in sorted(rows)]),
-                "assign_time": row['assigned_at'].isoformat(timespec='milliseconds')[:-1] + 'Z'}
-
-        # find kinda suitable orders,
-        # i.e. pending & properly located & proper item weight
-        t = select(
-            [tbl_orders]
-        ).where(
-            (tbl_orders.c.status == OrderStatusEnum.pending) &
-            (tbl_orders.c.region.in_(courier_info['regions'])) &
-            (tbl_orders.c.weight <= CourierTypeEnum.max_weight(courier_info['courier_type']))
-        ).order_by(tbl_orders.c.weight).with_for_update()
-        result = connection.execute(t)
-
-        # select fully suitable orders (right scheduled & proper total weight)
-        good_order_ids = []
-        total_weight = Decimal('0.0')
-        assign_time = datetime.now()
-        for order_row in result:
-            if can_be_delivered_in_time(assign_time.strftime('%H:%M'),
-                                        courier_info['working_hours'],
-                                        order_row['delivery_hours']):
-                if total_weight + order_row['weight'] > CourierTypeEnum.max_weight(courier_info['courier_type']):
-                    break
-                good_order_ids.append(order_row['order_id'])
-                total_weight += order_row['weight']
-        if not good_order_ids:
+            if order.order_id not in rejected
+        ]
+        order_ids = choose_orders(courier_info, candidates)
+        if not order_ids:
+            return None
+
+        missing = lock_pending_orders(connection, order_ids)
+        if not missing:
+            return order_ids
+        rejected |= missing
+        index.discard(missing)
+    return None
+
+
+def scan_orders(connection, courier_info,
+                working_hours: IntervalSet) -> List[int]:
+    """ Choose orders out of the orders table
+
+    Only the lightest candidates which may fit into the capacity are read
+    (see select_fitting_orders). The delivery windows are matched in the
+    query, so all of them are right scheduled. Only the chosen orders are
+    locked; if concurrent transactions have claimed some of them, the
+    candidates are ranked again without those. Every round rules out at
+    least one order, so it ends.
+    """
+    regions = courier_info['regions']
+    max_weight = CourierTypeEnum.max_weight(courier_info['courier_type'])
+    rejected = set()
+    while True:
+        result = connection.execute(
+            select_fitting_orders(regions, max_weight, working_hours,
+                                  candidates_needed(), rejected))
+        order_ids = choose_orders(courier_info, result.fetchall())
+        if not order_ids:
             return []
+        missing = lock_pending_orders(connection, order_ids)
+        if not missing:
+            return order_ids
+        rejected |= missing
 
-        # mark chosen orders as assigned (and release previously locked
-        # orders entries)
-        connection.execute(
-            tbl_orders.update().values(status=OrderStatusEnum.assigned,
-            ).where(tbl_orders.c.order_id.in_(good_order_ids))
-        )
 
-        # create delivery entry
-        result = connection.execute(tbl_deliveries.insert(), [{
-                "courier_id": courier_info['courier_id'],
-                "assigned_at": assign_time.isoformat(sep=' ', timespec='milliseconds')[:-1],
-                "coeff": CourierTypeEnum.get_coeff(courier_info['courier_type'])
-        }])
+def create_deliveries(connection, deliveries, assign_time: datetime):
+    """ Mark the orders as assigned and create deliveries for them
 
-        # create many-to-many relation between the created delivery and
-        # the assigned orders
-        rows_m2m = [{"delivery_id": result.inserted_primary_key[0],
-                    "order_id": i} for i in good_order_ids]
-        connection.execute(tbl_deliveries_orders.insert(), rows_m2m)
+    deliveries is a list of (courier_info, order_ids) pairs
+    """
+    assigned_at = assign_time.isoformat(sep=' ', timespec='milliseconds')[:-1]
 
-        return {"orders": list([{"id": x} for x in sorted(good_order_ids)]),
-                "assign_time": assign_time.isoformat(timespec='milliseconds')[:-1] + 'Z'}
+    # mark chosen orders as assigned (and release previously locked
+    # orders entries)
+    connection.execute(
+        tbl_orders.update().values(status=OrderStatusEnum.assigned,
+        ).where(tbl_orders.c.order_id.in_(
+            [i for _, order_ids in deliveries for i in order_ids]))
+    )
 
+    # create delivery entries
+    result = connection.execute(tbl_deliveries.insert(), [{
+            "courier_id": courier_info['courier_id'],
+            "assigned_at": assigned_at,
+            "coeff": CourierTypeEnum.get_coeff(courier_info['courier_type']),
+            "total_orders": len(order_ids),
+            "remaining_orders": len(order_ids)
+    } for courier_info, order_ids in deliveries])
+    if len(deliveries) == 1:
+        delivery_ids = {
+            deliveries[0][0]['courier_id']: result.inserted_primary_key[0]
+        }
+    else:
+        # a courier has at most one uncompleted delivery, so the ids of
+        # the bulk inserted deliveries can be found by courier ids
+        result = connection.execute(select_open_deliveries(
+            [courier_info['courier_id'] for courier_info, _ in deliveries]))
+        delivery_ids = {row['courier_id']: row['delivery_id'] for row in result}
 
-def complete_order(courier_id: int, order_id: int, complete_time: str):
-    with engine.connect() as connection:
-        s = select(
-            [
-                tbl_orders.c.order_id,
-                tbl_orders.c.status,
-                tbl_deliveries.c.delivery_id
+    # create many-to-many relation between the created deliveries and
+    # the assigned orders
+    rows_m2m = [{"delivery_id": delivery_ids[courier_info['courier_id']],
+                 "order_id": i}
+                for courier_info, order_ids in deliveries for i in order_ids]
+    connection.execute(tbl_deliveries_orders.insert(), rows_m2m)
+
+
+def assign_orders(connection, courier_id: int):
+    # check if courier_id exists and get its uncompleted delivery, the lock
+    # keeps concurrent requests of the same courier from creating two
+    # deliveries
+    cs = select_courier_with_delivery(
+        courier_id, [tbl_couriers.c.version]).with_for_update()
+    result = connection.execute(cs)
+    row = result.fetchone()
+    if row is None:
+        return None
+
+    # if the uncompleted delivery exists, return all assigned,
+    #  but not completed order ids
+    if row['delivery_id'] is not None:
+        result = connection.execute(select_assigned_orders(
+            [row['delivery_id']], [tbl_orders.c.order_id]))
+        rows = [e['order_id'] for e in result.fetchall()]
+        return format_assignment(rows, row['assigned_at'])
+
+    # the profile cannot change while the row is locked, so a cached one
+    # of the same version is current
+    courier_info = get_courier_profile(connection, courier_id, row['version'])
+
+    # the courier schedule is parsed and clipped once for all candidates
+    assign_time = datetime.now()
+    working_hours = courier_working_hours(courier_info, assign_time)
+    if not working_hours:
+        return []
+
+    good_order_ids = None
+    index = get_pending_index()
+    if index is not None:
+        good_order_ids = claim_indexed_orders(
+            connection, index, courier_info, working_hours)
+
+    if good_order_ids is None:
+        good_order_ids = scan_orders(connection, courier_info, working_hours)
+    if not good_order_ids:
+        return []
+
+    create_deliveries(connection, [(courier_info, good_order_ids)],
+                      assign_time)
+    # the claimed orders are locked till the commit, so dropping them
+    # ahead of it only saves the other threads a failed claim
+    if index is not None:
+        index.discard(good_order_ids)
+    return format_assignment(good_order_ids, assign_time)
+
+
+def assign_orders_batch(connection, courier_ids: List[int]):
+    """ Assign orders to many couriers out of one shared pending pool
+
+    The couriers are served in the given order within a single
+    transaction. Returns assignments keyed by courier id (in the same
+    shape assign_orders returns) or None if some courier does not exist.
+    """
+    courier_ids = list(dict.fromkeys(courier_ids))
+    cs = select(
+        [tbl_couriers]
+    ).where(
+        tbl_couriers.c.courier_id.in_(courier_ids)
+    ).order_by(tbl_couriers.c.courier_id).with_for_update()
+    couriers = {row['courier_id']: dict(row) for row in connection.execute(cs)}
+    if len(couriers) != len(courier_ids):
+        return None
+    assignments = {}
+
+    # couriers with uncompleted deliveries get them back
+    result = connection.execute(select_open_deliveries(courier_ids))
+    open_deliveries = {row['delivery_id']: row for row in result}
+    if open_deliveries:
+        delivery_orders = defaultdict(list)
+        result = connection.execute(select_assigned_orders(
+            list(open_deliveries),
+            [tbl_deliveries_orders.c.delivery_id, tbl_orders.c.order_id]))
+        for row in result:
+            delivery_orders[row['delivery_id']].append(row['order_id'])
+        for delivery_id, row in open_deliveries.items():
+            assignments[row['courier_id']] = format_assignment(
+                delivery_orders[delivery_id], row['assigned_at'])
+
+    assign_time = datetime.now()
+    idle = []
+    for courier_id in courier_ids:
+        if courier_id in assignments:
+            continue
+        assignments[courier_id] = {"orders": []}
+        working_hours = courier_working_hours(couriers[courier_id], assign_time)
+        if working_hours:
+            idle.append((couriers[courier_id], working_hours))
+    if not idle:
+        return {i: assignments[i] for i in courier_ids}
+
+    # load the pending pool shared by the idle couriers once, as a plain
+    # read: only the orders taken are locked
+    t = select_candidate_orders(
+        list(set(r for courier_info, _ in idle for r in courier_info['regions'])),
+        max(CourierTypeEnum.max_weight(courier_info['courier_type'])
+            for courier_info, _ in idle),
+        IntervalSet(p for _, working_hours in idle for p in working_hours)
+    )
+    pool = defaultdict(list)
+    for row in connection.execute(t):
+        pool[row['region']].append((row, IntervalSet(row['delivery_hours'])))
+
+    # split it among the couriers in turn, the orders claimed by concurrent
+    # transactions meanwhile are left out and the choice is repeated
+    taken = set()
+    missed = set()
+    deliveries = []
+    for courier_info, working_hours in idle:
+        max_weight = CourierTypeEnum.max_weight(courier_info['courier_type'])
+        order_ids = []
+        for _ in range(CLAIM_ATTEMPTS):
+            candidates = [
+                row for row, delivery_hours in heapq.merge(
+                    *[pool[r] for r in set(courier_info['regions'])],
+                    key=lambda x: x[0]['weight'])
+                if row['order_id'] not in taken and row['order_id'] not in missed
+                and row['weight'] <= max_weight
+                and working_hours.overlaps(delivery_hours)
             ]
+            order_ids = choose_orders(courier_info, candidates)
+            if not order_ids:
+                break
+            missing = lock_pending_orders(connection, order_ids)
+            if not missing:
+                break
+            missed |= missing
+            order_ids = []
+        if order_ids:
+            taken.update(order_ids)
+            deliveries.append((courier_info, order_ids))
+            assignments[courier_info['courier_id']] = format_assignment(
+                order_ids, assign_time)
+
+    if deliveries:
+        create_deliveries(connection, deliveries, assign_time)
+        index = pending_index_changes()
+        if index is not None:
+            index.discard(taken)
+    return {i: assignments[i] for i in courier_ids}
+
+
+def assign_idle_couriers(connection, after: int = 0, limit: int = 100) -> dict:
+    """ Assign orders to the idle couriers ahead of their requests
+
+    The couriers of the regions with pending orders are served by
+    assign_orders_batch (the rules are the ones of assign_orders), so
+    POST /orders/assign of such a courier returns the delivery made here.
+    The couriers locked by concurrent requests are skipped. Returns the
+    pass metrics, last_courier_id is where the next pass goes on from.
+    """
+    result = connection.execute(
+        select_idle_couriers(after, limit).with_for_update(skip_locked=True))
+    courier_ids = [row['courier_id'] for row in result]
+    assignments = assign_orders_batch(connection, courier_ids) if courier_ids else {}
+    return {
+        "idle_couriers": len(courier_ids),
+        "deliveries": sum(1 for x in assignments.values() if x['orders']),
+        "assigned_orders": sum(len(x['orders']) for x in assignments.values()),
+        # the last page wraps around to the start
+        "last_courier_id": courier_ids[-1] if len(courier_ids) == limit else 0,
+    }
+
+
+def lock_couriers(connection, courier_ids: List[int]):
+    """ Lock the courier rows ahead of their orders and deliveries
+
+    The writers lock the couriers (in id order) first, then the orders,
+    then the deliveries, as assign_orders and update_courier do, so a
+    completion cannot deadlock with a PATCH of the same courier.
+    """
+    connection.execute(
+        select(
+            [tbl_couriers.c.courier_id]
+        ).where(
+            tbl_couriers.c.courier_id.in_(courier_ids)
+        ).order_by(tbl_couriers.c.courier_id).with_for_update()
+    )
+
+
+def complete_order(connection, courier_id: int, order_id: int, complete_time: str):
+    s = select_courier_order(courier_id, order_id)
+    result = connection.execute(s)
+    row = result.fetchone()
+
+    # nonexistent / unassigned / belonging to another courier's delivery
+    if row is None:
+        return None
+
+    # the order is not pending, though the index may have missed its
+    # assignment (made by the dispatch job or another process)
+    index = pending_index_changes()
+    if index is not None:
+        index.discard([order_id])
+
+    # already completed order
+    if row['status'] == OrderStatusEnum.completed:
+        return order_id
+
+    # mark the order as completed, unless a concurrent request has done it
+    lock_couriers(connection, [courier_id])
+    delivery_id = row['delivery_id']
+    result = connection.execute(
+        tbl_orders.update().values(
+            status=OrderStatusEnum.completed,
+            completed_at=completed_at(complete_time)
         ).where(
             (tbl_orders.c.order_id == order_id) &
-            (tbl_deliveries.c.courier_id == courier_id) &
-            (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
-            (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id)
+            (tbl_orders.c.status == OrderStatusEnum.assigned)
         )
-        result = connection.execute(s)
-        row = result.fetchone()
+    )
+    if not result.rowcount:
+        return order_id
 
-        # nonexistent / unassigned / belonging to another courier's delivery
-        if row is None:
-            return None
+    connection.execute(
+        tbl_deliveries.update().values(
+            remaining_orders=tbl_deliveries.c.remaining_orders - 1
+        ).where(tbl_deliveries.c.delivery_id == delivery_id)
+    )
+    complete_delivery(connection, delivery_id, courier_id, row['coeff'])
+    return order_id
 
-        # already completed order
-        if row['status'] == OrderStatusEnum.completed:
-            return order_id
 
-        # mark the order as completed
-        delivery_id = row['delivery_id']
-        complete_time = datetime.strptime(complete_time, "%Y-%m-%dT%H:%M:%S.%fZ")
-        connection.execute(
-            tbl_orders.update().values(
-                status=OrderStatusEnum.completed,
-                completed_at=complete_time.isoformat(sep=' ', timespec='milliseconds')[:-1]
-            ).where(tbl_orders.c.order_id == order_id)
+def complete_delivery(connection, delivery_id: int, courier_id: int, coeff: int):
+    """ Finalize the delivery if it has no orders left to complete
+
+    The update is conditional on the counter, so only the transaction
+    which has completed the last order finalizes the delivery and adds it
+    to the courier's earnings.
+    """
+    result = connection.execute(
+        tbl_deliveries.update().values(
+            status=OrderStatusEnum.completed
+        ).where(
+            (tbl_deliveries.c.delivery_id == delivery_id) &
+            (tbl_deliveries.c.status == OrderStatusEnum.assigned) &
+            (tbl_deliveries.c.remaining_orders == 0) &
+            (tbl_deliveries.c.total_orders > 0)
         )
+    )
+    if result.rowcount:
+        add_earnings(connection, [(courier_id, coeff)])
+
+
+def add_earnings(connection, deliveries):
+    """ Add the finalized deliveries to the totals of their couriers
+
+    deliveries is a list of (courier_id, coeff) pairs
+    """
+    coeffs = defaultdict(int)
+    counts = defaultdict(int)
+    for courier_id, coeff in deliveries:
+        coeffs[courier_id] += coeff
+        counts[courier_id] += 1
+    courier_ids = sorted(coeffs)
+    connection.execute(
+        tbl_couriers.update().values(
+            earnings=tbl_couriers.c.earnings + BASE_EARNINGS * case(
+                coeffs, value=tbl_couriers.c.courier_id),
+            completed_deliveries=tbl_couriers.c.completed_deliveries + case(
+                counts, value=tbl_couriers.c.courier_id)
+        ).where(tbl_couriers.c.courier_id.in_(courier_ids))
+    )
+    invalidate_couriers(connection, courier_ids)
+
+
+def complete_orders_batch(connection, completions: List[dict]):
+    """ Complete many orders at once, each as complete_order would
+
+    completions is a list of dicts of complete_order arguments. Returns
+    the list of the complete_order results in the same order. The order
+    ids are looked up, completed and counted off their deliveries in bulk,
+    so the number of statements does not depend on the batch size.
+    """
+    order_ids = list(set(e['order_id'] for e in completions))
+    result = connection.execute(select_orders_with_delivery(order_ids))
+    orders = {row['order_id']: row for row in result}
+
+    # the order is not pending, though the index may have missed its
+    # assignment (made by the dispatch job or another process)
+    index = pending_index_changes()
+    if index is not None:
+        index.discard(list(orders))
+
+    results = []
+    complete_times = {}
+    for e in completions:
+        row = orders.get(e['order_id'])
+        # nonexistent / unassigned / belonging to another courier's delivery
+        if row is None or row['courier_id'] != e['courier_id']:
+            results.append(None)
+            continue
+        results.append(e['order_id'])
+        # the first completion of a repeated order counts
+        if row['status'] == OrderStatusEnum.assigned:
+            complete_times.setdefault(e['order_id'], completed_at(e['complete_time']))
+    if not complete_times:
+        return results
 
-        # check if it was the last completed order in the current delivery
-        t = select(
+    # lock the orders still assigned (after their couriers, see
+    # lock_couriers), the others have been completed by concurrent
+    # requests meanwhile
+    lock_couriers(connection, sorted(set(
+        orders[i]['courier_id'] for i in complete_times)))
+    result = connection.execute(
+        select(
             [tbl_orders.c.order_id]
         ).where(
-            (tbl_orders.c.status == OrderStatusEnum.assigned) &
-            (tbl_deliveries.c.delivery_id == delivery_id) &
-            (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
-            (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id)
+            (tbl_orders.c.order_id.in_(list(complete_times))) &
+            (tbl_orders.c.status == OrderStatusEnum.assigned)
+        ).order_by(tbl_orders.c.order_id).with_for_update()
+    )
+    completed = [row['order_id'] for row in result]
+    if not completed:
+        return results
+
+    connection.execute(
+        tbl_orders.update().values(
+            status=OrderStatusEnum.completed,
+            completed_at=case(
+                {i: complete_times[i] for i in completed},
+                value=tbl_orders.c.order_id)
+        ).where(tbl_orders.c.order_id.in_(completed))
+    )
+    counts = defaultdict(int)
+    for order_id in completed:
+        counts[orders[order_id]['delivery_id']] += 1
+    delivery_ids = sorted(counts)
+    connection.execute(
+        tbl_deliveries.update().values(
+            remaining_orders=tbl_deliveries.c.remaining_orders - case(
+                counts, value=tbl_deliveries.c.delivery_id)
+        ).where(tbl_deliveries.c.delivery_id.in_(delivery_ids))
+    )
+
+    # the deliveries are locked by the update above, so the finished ones
+    # found here are finalized by this transaction only
+    result = connection.execute(
+        select(
+            [
+                tbl_deliveries.c.delivery_id,
+                tbl_deliveries.c.courier_id,
+                tbl_deliveries.c.coeff
+            ]
+        ).where(
+            (tbl_deliveries.c.delivery_id.in_(delivery_ids)) &
+            (tbl_deliveries.c.status == OrderStatusEnum.assigned) &
+            (tbl_deliveries.c.remaining_orders == 0) &
+            (tbl_deliveries.c.total_orders > 0)
         )
-        result = connection.execute(t)
-        rows = result.fetchall()
-
-        # All orders in the current delivery have been completed
-        # Finalize the current delivery
-        if not rows:
-            connection.execute(
-                tbl_deliveries.update().values(
-                    status=OrderStatusEnum.completed
-                ).where(tbl_deliveries.c.delivery_id == delivery_id)
-            )
-    return order_id
+    )
+    finished = result.fetchall()
+    if finished:
+        connection.execute(
+            tbl_deliveries.update().values(
+                status=OrderStatusEnum.completed
+            ).where(tbl_deliveries.c.delivery_id.in_(
+                [row['delivery_id'] for row in finished]))
+        )
+        add_earnings(connection, [(row['courier_id'], row['coeff'])
+                                  for row in finished])
+    return results
@@ -0,0 +1,74 @@
+"""
+The pending orders index of this process (see utils/pending.py)
+
+It is loaded at startup and then resynced in the background every
+settings.pending_index_ttl seconds (see db/resync.py), which also picks up
+the changes made by other processes: other workers of the API and the
+dispatch job. Till then the orders posted or released by those are missing
+from the index, so it is only a hint: the claims are confirmed in the
+database and an empty choice falls back to the table scan.
+"""
+from typing import Optional
+
+from config import settings
+from schemas.orders import OrderStatusEnum
+from sqlalchemy import select
+from utils.pending import PendingIndex, PendingOrder
+from utils.time import IntervalSet
+from .resync import Resync
+from .schema import tbl_orders
+
+pending_index = PendingIndex()
+
+
+def pending_order(row) -> PendingOrder:
+    return PendingOrder(
+        row['order_id'],
+        row['weight'],
+        row['region'],
+        IntervalSet(row['delivery_hours']),
+        (row['slots_am'], row['slots_pm'])
+    )
+
+
+def load_pending_orders(connection):
+    mark = pending_index.mark()
+    result = connection.execute(
+        select(
+            [
+                tbl_orders.c.order_id,
+                tbl_orders.c.weight,
+                tbl_orders.c.region,
+                tbl_orders.c.delivery_hours,
+                tbl_orders.c.slots_am,
+                tbl_orders.c.slots_pm
+            ]
+        ).where(
+            tbl_orders.c.status == OrderStatusEnum.pending
+        )
+    )
+    pending_index.reset([pending_order(row) for row in result], mark)
+
+
+pending_resync = Resync(load_pending_orders, lambda: settings.pending_index_ttl)
+
+
+def get_pending_index() -> Optional[PendingIndex]:
+    """ The index, None if it is disabled or not loaded yet
+
+    A stale index is still returned while it is being resynced.
+    """
+    if not settings.pending_index:
+        return None
+    pending_resync.refresh()
+    return pending_index if pending_index.loaded else None
+
+
+def pending_index_changes() -> Optional[PendingIndex]:
+    """ The index to record the changes in, None if it is disabled
+
+    Unlike get_pending_index it is returned before the load as well, as
+    the changes recorded meanwhile are kept by reset (see
+    PendingIndex.mark).
+    """
+    return pending_index if settings.pending_index else None
@@ -0,0 +1,80 @@
+"""
+Connection pools which keep checkout statistics
+
+The time of a checkout includes waiting for a free connection, opening an
+overflow one and the pre-ping, i.e. everything a request spends before it
+can talk to the database.
+"""
+from time import perf_counter
+import threading
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class CheckoutStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timeout: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timeout
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total": round(self.wait_total, 6),
+                "wait_avg": round(self.wait_total / self.checkouts, 6)
+                if self.checkouts else 0.0,
+                "wait_max": round(self.wait_max, 6),
+            }
+
+
+class InstrumentedMixin:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.checkout_stats.record(perf_counter() - started, timeout=True)
+            raise
+        self.checkout_stats.record(perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(pool) -> dict:
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # negative while the pool itself is not filled up
+            "overflow": max(0, pool.overflow()),
+        })
+    if isinstance(pool, InstrumentedMixin):
+        stats.update(pool.checkout_stats.as_dict())
+    return stats
@@ -0,0 +1,239 @@
+from typing import List
+
+from schemas.orders import OrderStatusEnum
+from sqlalchemy import false, or_, select
+from sqlalchemy.sql import func
+from utils.time import IntervalSet
+from .schema import (
+    tbl_couriers,
+    tbl_courier_regions,
+    tbl_orders,
+    tbl_order_windows,
+    tbl_deliveries,
+    tbl_deliveries_orders
+)
+
+# Builders of the hot-path queries. They are shared by the db modules and
+# by the query plan check in migrations.py, so the plans being checked are
+# the plans being served.
+
+
+def select_courier_with_delivery(courier_id: int, columns=None):
+    """ The courier with the id and the time of its uncompleted delivery
+
+    delivery_id and assigned_at are NULL if there is no such delivery.
+    """
+    return select(
+        (columns or [tbl_couriers]) + [
+            tbl_deliveries.c.delivery_id,
+            tbl_deliveries.c.assigned_at
+        ]
+    ).select_from(
+        tbl_couriers.outerjoin(
+            tbl_deliveries,
+            (tbl_deliveries.c.courier_id == tbl_couriers.c.courier_id) &
+            (tbl_deliveries.c.status == OrderStatusEnum.assigned)
+        )
+    ).where(
+        tbl_couriers.c.courier_id == courier_id
+    )
+
+
+def select_open_deliveries(courier_ids: List[int]):
+    """ Uncompleted deliveries of the couriers (at most one per courier) """
+    return select(
+        [tbl_deliveries]
+    ).where(
+        (tbl_deliveries.c.courier_id.in_(courier_ids)) &
+        (tbl_deliveries.c.status == OrderStatusEnum.assigned)
+    )
+
+
+def select_courier_assigned_orders(courier_id: int):
+    """ Assigned orders of the courier's uncompleted delivery, lightest first
+
+    Every row carries the delivery_id and coeff of the delivery as well.
+    """
+    return select(
+        [
+            tbl_orders.c.order_id,
+            tbl_orders.c.weight,
+            tbl_orders.c.region,
+            tbl_orders.c.delivery_hours,
+            tbl_orders.c.slots_am,
+            tbl_orders.c.slots_pm,
+            tbl_deliveries.c.delivery_id,
+            tbl_deliveries.c.coeff
+        ]
+    ).where(
+        (tbl_deliveries.c.courier_id == courier_id) &
+        (tbl_deliveries.c.status == OrderStatusEnum.assigned) &
+        (tbl_deliveries_orders.c.delivery_id == tbl_deliveries.c.delivery_id) &
+        (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
+        (tbl_orders.c.status == OrderStatusEnum.assigned)
+    ).order_by(
+        tbl_orders.c.weight, tbl_orders.c.order_id
+    )
+
+
+def select_assigned_orders(delivery_ids: List[int], columns=None):
+    """ Assigned, but not completed orders of the deliveries """
+    return select(
+        columns or [tbl_orders]
+    ).where(
+        (tbl_deliveries_orders.c.delivery_id.in_(delivery_ids)) &
+        (tbl_orders.c.order_id == tbl_deliveries_orders.c.order_id) &
+        (tbl_orders.c.status == OrderStatusEnum.assigned)
+    )
+
+
+def window_overlap(working_hours: IntervalSet):
+    """ The order has a delivery window overlapping the working hours
+
+    Unlike the slot masks this is the exact test, the windows being
+    normalized in the same way as the working hours.
+    """
+    if not working_hours:
+        return false()
+    windows = tbl_order_windows
+    return select(
+        [windows.c.order_id]
+    ).where(
+        (windows.c.order_id == tbl_orders.c.order_id) &
+        or_(*[(windows.c.start_min < end) & (windows.c.end_min > start)
+              for start, end in working_hours])
+    ).exists()
+
+
+def candidate_filter(regions: List[int], max_weight,
+                     working_hours: IntervalSet):
+    slots_am, slots_pm = working_hours.slot_masks()
+    return (
+        (tbl_orders.c.status == OrderStatusEnum.pending) &
+        (tbl_orders.c.region.in_(regions)) &
+        (tbl_orders.c.weight <= max_weight) &
+        # the masks are checked on the order row itself, so only the rows
+        # passing them are probed for the windows
+        ((tbl_orders.c.slots_am.op('&')(slots_am) != 0) |
+         (tbl_orders.c.slots_pm.op('&')(slots_pm) != 0)) &
+        window_overlap(working_hours)
+    )
+
+
+def select_candidate_orders(regions: List[int], max_weight,
+                            working_hours: IntervalSet):
+    """ Pending orders which the courier may possibly take
+
+    i.e. properly located & proper item weight & deliverable within the
+    rest of the working day
+    """
+    return select(
+        [tbl_orders]
+    ).where(
+        candidate_filter(regions, max_weight, working_hours)
+    ).order_by(tbl_orders.c.weight)
+
+
+def select_fitting_orders(regions: List[int], max_weight,
+                          working_hours: IntervalSet, min_count: int = 0,
+                          exclude=()):
+    """ The lightest candidates which may fit into the capacity together
+
+    i.e. the candidates while their running total weight does not exceed
+    max_weight, and at least the min_count lightest ones. Only these rows
+    are sent over, however deep the backlog of the regions is. It is a
+    plain read, the caller locks the orders it takes; the ones it has
+    failed to lock are excluded from the ranking of the next attempt.
+    """
+    order = [tbl_orders.c.weight, tbl_orders.c.order_id]
+    ranked = select(
+        [
+            tbl_orders.c.order_id,
+            func.sum(tbl_orders.c.weight).over(order_by=order).label('running_weight'),
+            func.row_number().over(order_by=order).label('position')
+        ]
+    ).where(
+        candidate_filter(regions, max_weight, working_hours) &
+        tbl_orders.c.order_id.notin_(list(exclude))
+    ).subquery()
+    fitting = select(
+        [ranked.c.order_id]
+    ).where(
+        (ranked.c.running_weight <= max_weight) |
+        (ranked.c.position <= min_count)
+    )
+    return select(
+        [tbl_orders]
+    ).where(
+        (tbl_orders.c.order_id.in_(fitting)) &
+        (tbl_orders.c.status == OrderStatusEnum.pending)
+    ).order_by(*order)
+
+
+def select_courier_order(courier_id: int, order_id: int):
+    """ The order if it belongs to one of the courier's deliveries """
+    return select(
+        [
+            tbl_orders.c.order_id,
+            tbl_orders.c.status,
+            tbl_deliveries.c.delivery_id,
+            tbl_deliveries.c.coeff
+        ]
+    ).where(
+        (tbl_orders.c.order_id == order_id) &
+        (tbl_deliveries_orders.c.order_id == tbl_orders.c.order_id) &
+        (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id) &
+        (tbl_deliveries.c.courier_id == courier_id)
+    )
+
+
+def select_orders_with_delivery(order_ids: List[int]):
+    """ The orders which belong to some delivery along with it """
+    return select(
+        [
+            tbl_orders.c.order_id,
+            tbl_orders.c.status,
+            tbl_deliveries.c.delivery_id,
+            tbl_deliveries.c.courier_id,
+            tbl_deliveries.c.coeff
+        ]
+    ).where(
+        (tbl_orders.c.order_id.in_(order_ids)) &
+        (tbl_deliveries_orders.c.order_id == tbl_orders.c.order_id) &
+        (tbl_deliveries.c.delivery_id == tbl_deliveries_orders.c.delivery_id)
+    )
+
+
+def select_region_couriers(regions):
+    """ Ids of the couriers serving any of the regions
+
+    regions is a list of region ids or a select of them.
+    """
+    return select(
+        [tbl_courier_regions.c.courier_id]
+    ).where(
+        tbl_courier_regions.c.region.in_(regions)
+    ).distinct()
+
+
+def select_idle_couriers(after: int = 0, limit: int = 100):
+    """ Ids of the couriers without an uncompleted delivery
+
+    Only the couriers of the regions with pending orders, after the given
+    id and at most limit of them.
+    """
+    busy = select(
+        [tbl_deliveries.c.courier_id]
+    ).where(
+        tbl_deliveries.c.status == OrderStatusEnum.assigned
+    )
+    serving = select_region_couriers(
+        select([tbl_orders.c.region]).where(
+            tbl_orders.c.status == OrderStatusEnum.pending).distinct())
+    return select(
+        [tbl_couriers.c.courier_id]
+    ).where(
+        (tbl_couriers.c.courier_id > after) &
+        (tbl_couriers.c.courier_id.in_(serving)) &
+        (tbl_couriers.c.courier_id.notin_(busy))
+    ).order_by(tbl_couriers.c.courier_id).limit(limit)
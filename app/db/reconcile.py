@@ -0,0 +1,101 @@
+"""
+Reconciliation of the stored courier earnings
+
+    python3 reconcile.py         report the couriers whose stored totals drifted
+    python3 reconcile.py --fix   rewrite them with the ones rebuilt from history
+
+complete_order keeps couriers.earnings and couriers.completed_deliveries up
+to date. This rebuilds both from the completed deliveries and compares.
+Exits with 1 if some drift is left unfixed.
+"""
+if __name__ == "__main__":
+    import sys
+    # ahead of this directory, where db.py would shadow the db package
+    sys.path.insert(0, "..")
+
+import argparse
+import logging
+from typing import List
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.sql import func
+
+from schemas.couriers import BASE_EARNINGS
+from schemas.orders import OrderStatusEnum
+from db.schema import tbl_couriers, tbl_deliveries
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def select_earnings_drift(lock: bool = False):
+    """ Couriers with stored totals differing from the rebuilt ones """
+    history = select(
+        [
+            tbl_deliveries.c.courier_id,
+            func.sum(tbl_deliveries.c.coeff).label('coeff'),
+            func.count().label('deliveries')
+        ]
+    ).where(
+        tbl_deliveries.c.status == OrderStatusEnum.completed
+    ).group_by(
+        tbl_deliveries.c.courier_id
+    ).subquery()
+    earnings = func.coalesce(history.c.coeff, 0) * BASE_EARNINGS
+    deliveries = func.coalesce(history.c.deliveries, 0)
+    s = select(
+        [
+            tbl_couriers.c.courier_id,
+            tbl_couriers.c.earnings,
+            tbl_couriers.c.completed_deliveries,
+            earnings.label('rebuilt_earnings'),
+            deliveries.label('rebuilt_deliveries')
+        ]
+    ).select_from(
+        tbl_couriers.outerjoin(
+            history, history.c.courier_id == tbl_couriers.c.courier_id)
+    ).where(
+        (tbl_couriers.c.earnings != earnings) |
+        (tbl_couriers.c.completed_deliveries != deliveries)
+    ).order_by(
+        tbl_couriers.c.courier_id
+    )
+    # a completion racing with the fix waits for it and then adds on top
+    return s.with_for_update() if lock else s
+
+
+def reconcile_earnings(connection, fix: bool = False) -> List[dict]:
+    """ Find (and optionally fix) the drifted couriers, return them """
+    drift = [dict(row) for row in connection.execute(select_earnings_drift(fix))]
+    if fix and drift:
+        statement = tbl_couriers.update().where(
+            tbl_couriers.c.courier_id == bindparam('key_')
+        ).values(
+            earnings=bindparam('rebuilt_earnings'),
+            completed_deliveries=bindparam('rebuilt_deliveries')
+        )
+        for i in range(0, len(drift), BATCH_SIZE):
+            connection.execute(statement, [
+                dict(x, key_=x['courier_id']) for x in drift[i:i + BATCH_SIZE]
+            ])
+    return drift
+
+
+if __name__ == "__main__":
+    from db.db import engine
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Yapi earnings reconciliation')
+    parser.add_argument('--fix', action='store_true',
+                        help='rewrite the drifted totals')
+    args = parser.parse_args()
+    with engine.begin() as connection:
+        drift = reconcile_earnings(connection, args.fix)
+    for x in drift:
+        logger.warning('courier %d: earnings %d (rebuilt %d), completed '
+                       'deliveries %d (rebuilt %d)', x['courier_id'],
+                       x['earnings'], x['rebuilt_earnings'],
+                       x['completed_deliveries'], x['rebuilt_deliveries'])
+    logger.info('Drifted couriers: %d%s', len(drift),
+                ', fixed' if args.fix and drift else '')
+    sys.exit(1 if drift and not args.fix else 0)
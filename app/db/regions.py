@@ -0,0 +1,72 @@
+"""
+Courier regions: the courier_regions table and the index of this process
+
+courier_regions duplicates couriers.regions as (courier_id, region) rows,
+so the couriers of a region are found by an index search. The writes of
+this process update the reverse index (see utils/regions.py) after the
+commit, and it is resynced every settings.region_index_ttl seconds to pick
+up the changes made by other processes.
+"""
+from typing import Iterable, List, Optional, Tuple
+from time import monotonic
+import threading
+
+from config import settings
+from sqlalchemy import select
+from utils.regions import RegionIndex
+from .schema import tbl_courier_regions
+from .db import after_commit
+
+region_index = RegionIndex()
+
+_reload_lock = threading.Lock()
+_loaded_at = None
+
+
+def save_courier_regions(connection, couriers: List[Tuple[int, Iterable[int]]],
+                         replace: bool = False):
+    """ Store the regions of the (courier_id, regions) pairs
+
+    With replace the rows stored for the couriers before are deleted.
+    """
+    couriers = [(courier_id, sorted(set(regions))) for courier_id, regions in couriers]
+    if not couriers:
+        return
+    if replace:
+        connection.execute(
+            tbl_courier_regions.delete().where(
+                tbl_courier_regions.c.courier_id.in_([x for x, _ in couriers])))
+    rows = [{"courier_id": courier_id, "region": region}
+            for courier_id, regions in couriers for region in regions]
+    if rows:
+        connection.execute(tbl_courier_regions.insert(), rows)
+    if settings.region_index:
+        after_commit(connection, lambda: region_index.set_regions(couriers))
+
+
+def load_region_index(connection):
+    global _loaded_at
+    mark = region_index.mark()
+    result = connection.execute(
+        select([tbl_courier_regions.c.courier_id, tbl_courier_regions.c.region]))
+    region_index.reset([tuple(row) for row in result], mark)
+    _loaded_at = monotonic()
+
+
+def get_region_index(connection) -> Optional[RegionIndex]:
+    """ The index, resynced if it is stale
+
+    None if it is disabled or not loaded yet, as a single caller (thread
+    or coroutine) loads it and the others do not wait for that.
+    """
+    if not settings.region_index:
+        return None
+    if _loaded_at is not None and monotonic() - _loaded_at < settings.region_index_ttl:
+        return region_index
+    if _reload_lock.acquire(blocking=False):
+        try:
+            if _loaded_at is None or monotonic() - _loaded_at >= settings.region_index_ttl:
+                load_region_index(connection)
+        finally:
+            _reload_lock.release()
+    return region_index if region_index.loaded else None
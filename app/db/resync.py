@@ -0,0 +1,51 @@
+"""
+Process-local copies of the database state, resynced in the background
+
+A copy (the indexes of db/pending.py and db/regions.py) is loaded at
+startup and then reloaded every ttl seconds, which picks up the changes
+made by other processes. The first caller to find the copy stale starts
+the reload on a thread and a connection of its own and goes on with the
+copy as it is, so no request (and no event loop) waits for the reload.
+"""
+from time import monotonic
+import logging
+import threading
+
+from .db import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+
+class Resync:
+    """ Keeps a copy loaded by load(connection) at most ttl() seconds old """
+
+    def __init__(self, load, ttl):
+        self.load = load
+        self.ttl = ttl
+        self.loaded_at = None
+        # a failed load is retried after the ttl as well
+        self._attempted_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return (self._attempted_at is None or
+                monotonic() - self._attempted_at >= self.ttl())
+
+    def reload(self):
+        """ Load the copy now, unless another thread is loading it """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._attempted_at = monotonic()
+            run_in_transaction(self.load)
+            self.loaded_at = monotonic()
+        except Exception:
+            logger.exception('Failed to load %s', self.load.__name__)
+        finally:
+            self._lock.release()
+
+    def refresh(self):
+        """ Start a reload in the background if the copy is stale """
+        if self.stale and not self._lock.locked():
+            threading.Thread(target=self.reload, daemon=True).start()
@@ -1,15 +1,14 @@
-if __name__ == "__main__":
-    import sys
-    sys.path.append("..")
+from typing import List
 
 from sqlalchemy import (
     MetaData, Table, Column, BigInteger, Enum, JSON, Numeric, Integer,
-    ForeignKey, create_engine
+    ForeignKey, Index
 )
 from sqlalchemy.dialects.mysql import DATETIME
 
 from schemas.couriers import CourierTypeEnum
 from schemas.orders import OrderStatusEnum
+from utils.time import IntervalSet, dump_hours
 
 metadata = MetaData()
 
@@ -20,6 +19,23 @@ tbl_couriers = Table(
     Column("courier_type", Enum(CourierTypeEnum), nullable=False),
     Column("regions", JSON, nullable=False),
     Column("working_hours", JSON, nullable=False),
+    Column("slots_am", BigInteger, nullable=False, server_default='0'),
+    Column("slots_pm", BigInteger, nullable=False, server_default='0'),
+    # totals of the completed deliveries, kept by complete_order
+    Column("earnings", BigInteger, nullable=False, server_default='0'),
+    Column("completed_deliveries", Integer, nullable=False, server_default='0'),
+    # bumped on every profile change, checks cached profiles
+    Column("version", Integer, nullable=False, server_default='0'),
+)
+
+tbl_courier_regions = Table(
+    "courier_regions",
+    metadata,
+    Column("courier_id", BigInteger, ForeignKey('couriers.courier_id',
+        ondelete="CASCADE"), primary_key=True),
+    Column("region", BigInteger, primary_key=True, autoincrement=False),
+    # couriers serving a region
+    Index("ix_courier_regions_region", "region", "courier_id"),
 )
 
 tbl_orders = Table(
@@ -29,8 +45,25 @@ tbl_orders = Table(
     Column("weight", Numeric(precision=5, scale=2), nullable=False),
     Column("region", BigInteger, nullable=False),
     Column("delivery_hours", JSON, nullable=False),
+    Column("slots_am", BigInteger, nullable=False, server_default='0'),
+    Column("slots_pm", BigInteger, nullable=False, server_default='0'),
     Column("status", Enum(OrderStatusEnum), server_default=OrderStatusEnum.pending),
     Column("completed_at", DATETIME(fsp=2)),
+    # candidate scan of assign_orders
+    Index("ix_orders_status_region_weight", "status", "region", "weight"),
+)
+
+tbl_order_windows = Table(
+    "order_windows",
+    metadata,
+    # delivery_hours split into [start_min, end_min) minute intervals, see
+    # window_values
+    Column("order_id", BigInteger, ForeignKey('orders.order_id',
+        ondelete="CASCADE"), primary_key=True),
+    Column("start_min", Integer, primary_key=True, autoincrement=False),
+    Column("end_min", Integer, nullable=False),
+    # orders delivered within a span of the day
+    Index("ix_order_windows_minutes", "start_min", "end_min", "order_id"),
 )
 
 tbl_deliveries = Table(
@@ -41,6 +74,11 @@ tbl_deliveries = Table(
     Column("status", Enum(OrderStatusEnum), server_default=OrderStatusEnum.assigned),
     Column("assigned_at", DATETIME(fsp=2), nullable=False),
     Column("coeff", Integer, nullable=False),
+    # orders of the delivery: all and the not completed ones
+    Column("total_orders", Integer, nullable=False, server_default='0'),
+    Column("remaining_orders", Integer, nullable=False, server_default='0'),
+    # open delivery lookup & earnings
+    Index("ix_deliveries_courier_status", "courier_id", "status"),
 )
 
 tbl_deliveries_orders = Table(
@@ -49,10 +87,29 @@ tbl_deliveries_orders = Table(
     Column("delivery_id", Integer, ForeignKey('deliveries.delivery_id',
         ondelete="CASCADE"), nullable=False),
     Column("order_id", BigInteger, nullable=False),
+    Index("ix_deliveries_orders_delivery", "delivery_id", "order_id"),
+    Index("ix_deliveries_orders_order", "order_id"),
 )
 
-if __name__ == "__main__":
-    from config import settings
-    engine = create_engine(settings.database_url)
-    metadata.drop_all(engine)
-    metadata.create_all(engine)
+tbl_schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+def hours_values(column: str, hours) -> dict:
+    """ Column values of the hours along with their slot bitmasks """
+    slots_am, slots_pm = IntervalSet(hours).slot_masks()
+    return {column: dump_hours(hours), "slots_am": slots_am, "slots_pm": slots_pm}
+
+
+def window_values(order_id: int, hours) -> List[dict]:
+    """ order_windows rows of the delivery hours
+
+    The hours are normalized as IntervalSet does it, so a window is never
+    empty and never wraps past midnight, and the windows of an order do not
+    overlap.
+    """
+    return [{"order_id": order_id, "start_min": start, "end_min": end}
+            for start, end in IntervalSet(hours)]
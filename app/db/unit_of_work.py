@@ -0,0 +1,111 @@
+"""
+One connection and one transaction per request
+
+A route takes the unit of work as a dependency and runs the db functions
+through it. UnitOfWorkRoute commits it once the route has produced its
+response, but before the response is sent, so a failed commit turns into
+an error response instead of a lost write the client was told about.
+(FastAPI would run the teardown of a yield dependency only after the
+response has been sent.)
+"""
+from fastapi import Request
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from .db import AFTER_COMMIT, engine, async_engine
+
+
+class UnitOfWork:
+    """ The connection is checked out on the first use only """
+
+    def __init__(self):
+        self.connection = None
+        self.transaction = None
+
+    @property
+    def info(self) -> dict:
+        if async_engine is not None:
+            return self.connection.sync_connection.info
+        return self.connection.info
+
+    async def run(self, fn, *args, **kwargs):
+        """ fn(connection, *args, **kwargs) within the transaction
+
+        A new transaction is begun if the previous one has been committed.
+        """
+        if async_engine is not None:
+            if self.connection is None:
+                self.connection = await async_engine.connect()
+            if self.transaction is None or not self.transaction.is_active:
+                self.transaction = await self.connection.begin()
+            return await self.connection.run_sync(fn, *args, **kwargs)
+
+        if self.connection is None:
+            self.connection = await run_in_threadpool(engine.connect)
+        if self.transaction is None or not self.transaction.is_active:
+            self.transaction = self.connection.begin()
+        return await run_in_threadpool(fn, self.connection, *args, **kwargs)
+
+    async def commit(self):
+        if self.transaction is None or not self.transaction.is_active:
+            return
+        if async_engine is not None:
+            await self.transaction.commit()
+        else:
+            await run_in_threadpool(self.transaction.commit)
+        for callback in self.info.pop(AFTER_COMMIT, []):
+            callback()
+
+    async def close(self):
+        """ Roll back whatever is not committed and release the connection """
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        self.transaction = None
+        if async_engine is not None:
+            connection.sync_connection.info.pop(AFTER_COMMIT, None)
+            await connection.close()
+        else:
+            connection.info.pop(AFTER_COMMIT, None)
+            await run_in_threadpool(connection.close)
+
+
+async def get_unit_of_work(request: Request):
+    unit_of_work = UnitOfWork()
+    request.state.unit_of_work = unit_of_work
+    try:
+        yield unit_of_work
+    finally:
+        # normally already closed by UnitOfWorkRoute
+        await unit_of_work.close()
+
+
+class UnitOfWorkRoute(APIRoute):
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            try:
+                response = await handler(request)
+                unit_of_work = getattr(request.state, 'unit_of_work', None)
+                if unit_of_work is not None:
+                    await unit_of_work.commit()
+                return response
+            finally:
+                unit_of_work = getattr(request.state, 'unit_of_work', None)
+                if unit_of_work is not None:
+                    await unit_of_work.close()
+
+        return route_handler
+
+
+async def run_in_unit_of_work(fn, *args, **kwargs):
+    """ fn in a unit of work of its own, for the code outside of routes """
+    unit_of_work = UnitOfWork()
+    try:
+        result = await unit_of_work.run(fn, *args, **kwargs)
+        await unit_of_work.commit()
+    finally:
+        await unit_of_work.close()
+    return result
@@ -0,0 +1,129 @@
+"""
+Streaming NDJSON ingest for POST /couriers and POST /orders
+
+A request with the application/x-ndjson content type carries one item per
+line. The lines are validated as they arrive and the valid items are saved
+in chunks of settings.ingest_chunk_size, each chunk in a transaction of
+its own, so the memory use does not depend on the size of the upload.
+Unlike the JSON body, which is rejected as a whole, every valid item is
+saved, and the response reports both the accepted and the rejected ones:
+
+    {"couriers": [{"id": 1}, ...],
+     "validation_error": {"couriers": [{"id": 2}, {"line": 7}, ...]}}
+
+An item is rejected if it is invalid, repeats an id of the same upload or
+exists already. A line without a recognizable id is reported by its
+number.
+"""
+import json
+
+from fastapi import APIRouter, Depends, Request
+from starlette.routing import Match
+
+from config import settings
+from responses import FastJSONResponse
+from schemas.bulk import courier_row, order_row
+from db.couriers import save_posted_couriers
+from db.orders import save_posted_orders
+from db.unit_of_work import UnitOfWork, UnitOfWorkRoute, get_unit_of_work
+
+NDJSON = 'application/x-ndjson'
+
+
+def is_ndjson(scope) -> bool:
+    for name, value in scope['headers']:
+        if name == b'content-type':
+            return value.split(b';')[0].strip().decode('latin-1') == NDJSON
+    return False
+
+
+class NdjsonRoute(UnitOfWorkRoute):
+    """ Matches the requests with an NDJSON body only
+
+    The router is included ahead of the JSON routes of the same paths,
+    which get all the other requests.
+    """
+
+    def matches(self, scope):
+        match, child_scope = super().matches(scope)
+        if match != Match.NONE and not is_ndjson(scope):
+            return Match.NONE, {}
+        return match, child_scope
+
+
+async def iter_lines(stream):
+    buffer = b''
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    yield buffer
+
+
+async def ingest(request: Request, uow: UnitOfWork, item_row, id_field: str,
+                 save, name: str):
+    accepted = []
+    rejected = []
+    chunk = {}
+
+    async def flush():
+        new_ids = set(await uow.run(save, list(chunk.values())))
+        await uow.commit()
+        for item_id in chunk:
+            (accepted if item_id in new_ids else rejected).append({"id": item_id})
+        chunk.clear()
+
+    line_number = 0
+    async for line in iter_lines(request.stream()):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        row = item_row(data)
+        if row is None:
+            item_id = data.get(id_field) if isinstance(data, dict) else None
+            if isinstance(item_id, int):
+                rejected.append({"id": item_id})
+            else:
+                rejected.append({"line": line_number})
+            continue
+
+        item_id = row[id_field]
+        if item_id in chunk:
+            rejected.append({"id": item_id})
+            continue
+        chunk[item_id] = row
+        if len(chunk) >= settings.ingest_chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+
+    return FastJSONResponse(
+        status_code=201,
+        content={name: accepted, "validation_error": {name: rejected}}
+    )
+
+
+router = APIRouter(route_class=NdjsonRoute)
+
+
+@router.post("/couriers", include_in_schema=False)
+async def route_post_couriers_ndjson(
+    request: Request,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    return await ingest(request, uow, courier_row, 'courier_id',
+                        save_posted_couriers, 'couriers')
+
+
+@router.post("/orders", include_in_schema=False)
+async def route_post_orders_ndjson(
+    request: Request,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    return await ingest(request, uow, order_row, 'order_id',
+                        save_posted_orders, 'orders')
@@ -1,27 +1,67 @@
-from fastapi import FastAPI
+from fastapi import Body, Depends, FastAPI
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
-from pydantic import ValidationError, PositiveInt
+from pydantic import PositiveInt
+from starlette.concurrency import run_in_threadpool
 
 from config import settings
 from exceptions import CouriersLoadException, OrdersLoadException
-from schemas.couriers import (
-    CouriersPostRequest,
-    CourierItem,
-    CourierUpdateRequest
-)
+from ingest import router as ingest_router
+from responses import FastJSONResponse
+from schemas.bulk import validate_couriers, validate_orders
+from schemas.couriers import CourierItem, CourierUpdateRequest
 from schemas.orders import (
-    OrdersPostRequest,
-    OrderItem,
     OrdersAssignPostRequest,
-    OrdersCompletePostRequest
+    OrdersAssignBatchPostRequest,
+    OrdersCompletePostRequest,
+    OrdersCompleteBatchPostRequest
 )
-from utils.time import validate_hours_input
 from db.couriers import save_posted_couriers, update_courier, get_courier_info
-from db.orders import save_posted_orders, assign_orders, complete_order
+from db.orders import (
+    save_posted_orders,
+    assign_orders,
+    assign_orders_batch,
+    complete_order,
+    complete_orders_batch
+)
+from db.auto_dispatch import auto_dispatcher, get_auto_dispatch_stats
+from db.courier_cache import get_courier_cache_stats
+from db.db import get_pool_stats
+from db.pending import pending_resync
+from db.regions import get_region_index
+from db.unit_of_work import (
+    UnitOfWork,
+    UnitOfWorkRoute,
+    get_unit_of_work,
+    run_in_unit_of_work
+)
+
+app = FastAPI(default_response_class=FastJSONResponse)
+# commits the unit of work of a request before its response is sent
+app.router.route_class = UnitOfWorkRoute
+# NDJSON uploads to POST /couriers and POST /orders, ahead of the JSON
+# routes of the same paths
+app.include_router(ingest_router)
+
+
+@app.on_event("startup")
+async def load_indexes():
+    # ahead of the first requests, then they are resynced in the background
+    if settings.pending_index:
+        await run_in_threadpool(pending_resync.reload)
+    await run_in_unit_of_work(get_region_index)
+
+
+@app.on_event("startup")
+async def start_auto_dispatch():
+    if settings.auto_dispatch:
+        auto_dispatcher.start(settings.auto_dispatch_interval,
+                              settings.auto_dispatch_batch_size)
 
-app = FastAPI()
+
+@app.on_event("shutdown")
+async def stop_auto_dispatch():
+    await auto_dispatcher.stop()
 
 
 @app.exception_handler(RequestValidationError)
@@ -41,7 +81,7 @@ async def validation_exception_handler(request, exc):
             details = {"validation_error": {
                 "orders": []
             }}
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=400,
         content=details
     )
@@ -53,7 +93,7 @@ def couriers_load_exception_handler(request, exc: CouriersLoadException):
     details = {"validation_error": {
         "couriers": ids
     }}
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=400,
         content=details
     )
@@ -65,7 +105,7 @@ def orders_load_exception_handler(request, exc: OrdersLoadException):
     details = {"validation_error": {
         "orders": ids
     }}
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=400,
         content=details
     )
@@ -73,28 +113,22 @@ def orders_load_exception_handler(request, exc: OrdersLoadException):
 
 # 1: POST /couriers
 @app.post("/couriers")
-def route_post_couriers(request_body: CouriersPostRequest):
-    if not request_body.data:
+async def route_post_couriers(
+    request_body: dict = Body(...),
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    # validated in a single pass, see schemas/bulk.py
+    try:
+        couriers_good, couriers_bad = validate_couriers(request_body)
+    except ValueError:
+        raise CouriersLoadException([])
+    if not couriers_good and not couriers_bad:
         raise CouriersLoadException([])
-    couriers_good = []
-    couriers_bad = []
-    for kinda_courier in request_body.data:
-        courier_id = kinda_courier.courier_id
-        try:
-            courier = CourierItem(**kinda_courier.dict())
-        except ValidationError as e:
-            couriers_bad.append(courier_id)
-        else:
-            if not validate_hours_input(courier.working_hours):
-                couriers_bad.append(courier_id)
-            else:
-                couriers_good.append(courier)
-
     if couriers_bad:
         raise CouriersLoadException(couriers_bad)
-    inserted_ids = save_posted_couriers(couriers_good)
+    inserted_ids = await uow.run(save_posted_couriers, couriers_good)
     details = {"couriers": list([{"id": x} for x in inserted_ids])}
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=201,
         content=details
     )
@@ -102,39 +136,36 @@ def route_post_couriers(request_body: CouriersPostRequest):
 
 # 2: PATCH /couriers/$courier_id
 @app.patch("/couriers/{courier_id}")
-def route_patch_courier(
+async def route_patch_courier(
     courier_id: PositiveInt,
-    courier_info: CourierUpdateRequest
+    courier_info: CourierUpdateRequest,
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
-    result = update_courier(courier_id, courier_info.dict(exclude_unset=True))
+    result = await uow.run(
+        update_courier, courier_id, courier_info.dict(exclude_unset=True))
     if not result:
-        return JSONResponse(status_code=404)
-    return CourierItem(courier_id=courier_id, **result)
+        return FastJSONResponse(status_code=404)
+    return FastJSONResponse(CourierItem(courier_id=courier_id, **result).dict())
 
 
 # 3: POST /orders
 @app.post("/orders")
-def route_post_orders(request_body: OrdersPostRequest):
-    if not request_body.data:
+async def route_post_orders(
+    request_body: dict = Body(...),
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    # validated in a single pass, see schemas/bulk.py
+    try:
+        orders_good, orders_bad = validate_orders(request_body)
+    except ValueError:
+        raise OrdersLoadException([])
+    if not orders_good and not orders_bad:
         raise OrdersLoadException([])
-    orders_good = []
-    orders_bad = []
-    for kinda_order in request_body.data:
-        order_id = kinda_order.order_id
-        try:
-            order = OrderItem(**kinda_order.dict())
-        except ValidationError as e:
-            orders_bad.append(order_id)
-        else:
-            if not validate_hours_input(order.delivery_hours):
-                orders_bad.append(order_id)
-            else:
-                orders_good.append(order)
     if orders_bad:
         raise OrdersLoadException(orders_bad)
-    inserted_ids = save_posted_orders(orders_good)
+    inserted_ids = await uow.run(save_posted_orders, orders_good)
     details = {"orders": list([{"id": x} for x in inserted_ids])}
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=201,
         content=details
     )
@@ -142,28 +173,84 @@ def route_post_orders(request_body: OrdersPostRequest):
 
 # 4: POST /orders/assign
 @app.post("/orders/assign")
-def route_assign_orders(request_body: OrdersAssignPostRequest):
-    result = assign_orders(request_body.courier_id)
+async def route_assign_orders(
+    request_body: OrdersAssignPostRequest,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    result = await uow.run(assign_orders, request_body.courier_id)
     if result is None:
-        return JSONResponse(status_code=400)
+        return FastJSONResponse(status_code=400)
     elif not result:
-        return {"orders": []}
-    return result
+        return FastJSONResponse({"orders": []})
+    return FastJSONResponse(result)
+
+
+# 4a: POST /orders/assign/batch
+@app.post("/orders/assign/batch")
+async def route_assign_orders_batch(
+    request_body: OrdersAssignBatchPostRequest,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    result = await uow.run(assign_orders_batch, request_body.courier_ids)
+    if result is None:
+        return FastJSONResponse(status_code=400)
+    return FastJSONResponse(
+        {"couriers": list([dict(courier_id=k, **v) for k, v in result.items()])})
 
 
 # 5: POST /orders/complete
 @app.post("/orders/complete")
-def route_complete_order(request_body: OrdersCompletePostRequest):
-    order_id = complete_order(**request_body.dict())
+async def route_complete_order(
+    request_body: OrdersCompletePostRequest,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    order_id = await uow.run(complete_order, **request_body.dict())
     if not order_id:
-        return JSONResponse(status_code=400)
-    return {"order_id": order_id}
+        return FastJSONResponse(status_code=400)
+    return FastJSONResponse({"order_id": order_id})
+
+
+# 5a: POST /orders/complete/batch
+@app.post("/orders/complete/batch")
+async def route_complete_orders_batch(
+    request_body: OrdersCompleteBatchPostRequest,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    completions = request_body.dict()['data']
+    results = await uow.run(complete_orders_batch, completions)
+    # the status code POST /orders/complete would have given for the item
+    return FastJSONResponse({"orders": list([
+        {"courier_id": e['courier_id'], "order_id": e['order_id'],
+         "status_code": 200 if result else 400}
+        for e, result in zip(completions, results)
+    ])})
 
 
 # 6: GET /couriers/$courier_id
 @app.get("/couriers/{courier_id}")
-def route_get_courier(courier_id: PositiveInt):
-    result = get_courier_info(courier_id)
+async def route_get_courier(
+    courier_id: PositiveInt,
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    result = await uow.run(get_courier_info, courier_id)
     if not result:
-        return JSONResponse(status_code=404)
-    return result
+        return FastJSONResponse(status_code=404)
+    return FastJSONResponse(result)
+
+
+# internal: GET /internal/pool
+@app.get("/internal/pool")
+async def route_get_pool_stats():
+    return FastJSONResponse(get_pool_stats())
+
+
+# internal: GET /internal/courier-cache
+@app.get("/internal/courier-cache")
+async def route_get_courier_cache_stats():
+    return FastJSONResponse(get_courier_cache_stats())
+
+
+# internal: GET /internal/dispatcher
+@app.get("/internal/dispatcher")
+async def route_get_auto_dispatch_stats():
+    return FastJSONResponse(get_auto_dispatch_stats())
@@ -0,0 +1,32 @@
+"""
+JSON responses rendered with orjson
+
+The routes return FastJSONResponse themselves, which skips the
+jsonable_encoder pass FastAPI makes over a returned dict or model. The
+output is byte for byte the one of the default JSONResponse: compact, with
+decimals encoded as pydantic does and hours as "HH:MM-HH:MM" strings.
+"""
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic.json import ENCODERS_BY_TYPE
+
+from utils.time import TimeInterval
+
+
+def default(obj):
+    # the types jsonable_encoder would have converted, the same way
+    if isinstance(obj, Decimal):
+        return ENCODERS_BY_TYPE[Decimal](obj)
+    if isinstance(obj, TimeInterval):
+        return str(obj)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=default,
+                            option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,134 @@
+"""
+Single-pass validation of the bulk POST /couriers and POST /orders payloads
+
+Every item is checked once and turned straight into its insert row. The
+fast path takes only well-formed items with the exact JSON types, which is
+the usual case. Anything off it (a bad item, but also a coercible one like
+"courier_id": "5") is decided by the strict model, so the outcome is always
+the one of CourierItem/OrderItem.
+"""
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from utils.time import TimeInterval
+from schemas.couriers import CourierItem, CourierKindaItem, CourierTypeEnum
+from schemas.orders import OrderItem, OrderKindaItem
+
+COURIER_FIELDS = frozenset(CourierItem.__fields__)
+ORDER_FIELDS = frozenset(OrderItem.__fields__)
+COURIER_TYPES = {x.value: x for x in CourierTypeEnum}
+MIN_WEIGHT = Decimal('0.01')
+MAX_WEIGHT = Decimal('50.00')
+
+
+def is_positive_int(v) -> bool:
+    return type(v) is int and v > 0
+
+
+def parse_hours(hours) -> Optional[List[TimeInterval]]:
+    if type(hours) is not list:
+        return None
+    try:
+        return [TimeInterval.parse(x) for x in hours]
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_weight(weight) -> Optional[Decimal]:
+    # the same conversion as pydantic does
+    if type(weight) is float:
+        weight = Decimal(repr(weight))
+    elif type(weight) is int:
+        weight = Decimal(weight)
+    else:
+        return None
+    if weight.is_finite() and MIN_WEIGHT <= weight <= MAX_WEIGHT:
+        return weight
+    return None
+
+
+def fast_courier_row(item) -> Optional[dict]:
+    if type(item) is not dict or item.keys() != COURIER_FIELDS:
+        return None
+    courier_id = item['courier_id']
+    courier_type = COURIER_TYPES.get(item['courier_type']) \
+        if type(item['courier_type']) is str else None
+    regions = item['regions']
+    if (not is_positive_int(courier_id) or courier_type is None or
+            type(regions) is not list or
+            not all(is_positive_int(x) for x in regions)):
+        return None
+    working_hours = parse_hours(item['working_hours'])
+    if working_hours is None:
+        return None
+    return dict(courier_id=courier_id, courier_type=courier_type,
+                regions=regions, working_hours=working_hours)
+
+
+def fast_order_row(item) -> Optional[dict]:
+    if type(item) is not dict or item.keys() != ORDER_FIELDS:
+        return None
+    order_id = item['order_id']
+    region = item['region']
+    if not is_positive_int(order_id) or not is_positive_int(region):
+        return None
+    weight = parse_weight(item['weight'])
+    delivery_hours = parse_hours(item['delivery_hours'])
+    if weight is None or delivery_hours is None:
+        return None
+    return dict(order_id=order_id, weight=weight, region=region,
+                delivery_hours=delivery_hours)
+
+
+def model_row(model, item) -> Optional[dict]:
+    try:
+        return model.parse_obj(item).dict()
+    except ValidationError:
+        return None
+
+
+def courier_row(item) -> Optional[dict]:
+    """ Insert row of a courier item, None if the item is invalid """
+    row = fast_courier_row(item)
+    return row if row is not None else model_row(CourierItem, item)
+
+
+def order_row(item) -> Optional[dict]:
+    """ Insert row of an order item, None if the item is invalid """
+    row = fast_order_row(item)
+    return row if row is not None else model_row(OrderItem, item)
+
+
+def validate_bulk(body, item_row, kinda_item,
+                  id_field: str) -> Tuple[List[dict], List[int]]:
+    """ Insert rows and ids of the invalid items of a bulk payload
+
+    Raises ValueError if the payload is malformed as a whole: not a
+    {"data": [...]} object or an item without an integer id.
+    """
+    if (type(body) is not dict or body.keys() != {'data'} or
+            type(body['data']) is not list):
+        raise ValueError('malformed payload')
+
+    rows = []
+    bad_ids = []
+    for item in body['data']:
+        row = item_row(item)
+        if row is not None:
+            rows.append(row)
+            continue
+        try:
+            bad_ids.append(getattr(kinda_item.parse_obj(item), id_field))
+        except ValidationError:
+            raise ValueError('item without an id')
+    return rows, bad_ids
+
+
+def validate_couriers(body) -> Tuple[List[dict], List[int]]:
+    return validate_bulk(body, courier_row, CourierKindaItem, 'courier_id')
+
+
+def validate_orders(body) -> Tuple[List[dict], List[int]]:
+    return validate_bulk(body, order_row, OrderKindaItem, 'order_id')
@@ -1,8 +1,11 @@
 from enum import Enum
 from typing import List, Optional
 
-from pydantic import BaseModel, PositiveInt, validator
-from utils.time import validate_hours_input
+from pydantic import BaseModel, PositiveInt
+from utils.time import TimeInterval
+
+# earnings per unit of the delivery coefficient
+BASE_EARNINGS = 500
 
 
 class CourierTypeEnum(str, Enum):
@@ -44,17 +47,11 @@ class CourierItem(BaseModel):
     courier_id: PositiveInt
     courier_type: CourierTypeEnum
     regions: List[PositiveInt]
-    working_hours: List[str]
-
-    class Config:
-        extra = 'forbid'
-
-
-class CouriersPostRequest(BaseModel):
-    data: List[CourierKindaItem]
+    working_hours: List[TimeInterval]
 
     class Config:
         extra = 'forbid'
+        json_encoders = {TimeInterval: str}
 
 
 class CourierUpdateRequest(BaseModel):
@@ -62,13 +59,7 @@ class CourierUpdateRequest(BaseModel):
 
     courier_type: Optional[CourierTypeEnum] = None
     regions: Optional[List[PositiveInt]] = None
-    working_hours: Optional[List[str]] = None
-
-    @validator('working_hours')
-    def check_working_hours(cls, v):
-        if v and not validate_hours_input(v):
-            raise ValueError('wrong date format')
-        return v
+    working_hours: Optional[List[TimeInterval]] = None
 
     class Config:
         extra = 'forbid'
@@ -2,9 +2,9 @@ from enum import Enum
 from typing import List, Optional
 from decimal import Decimal
 
-from pydantic import BaseModel, Field, PositiveInt, validator
+from pydantic import BaseModel, Field, PositiveInt, conlist, validator
 
-from utils.time import validate_iso_time
+from utils.time import TimeInterval, validate_iso_time
 
 
 class OrderStatusEnum(str, Enum):
@@ -28,21 +28,22 @@ class OrderItem(BaseModel):
     order_id: PositiveInt
     weight: Decimal = Field(..., ge=Decimal('0.01'), le=Decimal('50.00'))
     region: PositiveInt
-    delivery_hours: List[str]
+    delivery_hours: List[TimeInterval]
 
     class Config:
         extra = 'forbid'
+        json_encoders = {TimeInterval: str}
 
 
-class OrdersPostRequest(BaseModel):
-    data: List[OrderKindaItem]
+class OrdersAssignPostRequest(BaseModel):
+    courier_id: PositiveInt
 
     class Config:
         extra = 'forbid'
 
 
-class OrdersAssignPostRequest(BaseModel):
-    courier_id: PositiveInt
+class OrdersAssignBatchPostRequest(BaseModel):
+    courier_ids: conlist(PositiveInt, min_items=1)
 
     class Config:
         extra = 'forbid'
@@ -61,3 +62,10 @@ class OrdersCompletePostRequest(BaseModel):
 
     class Config:
         extra = 'forbid'
+
+
+class OrdersCompleteBatchPostRequest(BaseModel):
+    data: conlist(OrdersCompletePostRequest, min_items=1)
+
+    class Config:
+        extra = 'forbid'
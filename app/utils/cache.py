@@ -0,0 +1,94 @@
+"""
+Bounded LRU cache with entries expiring after a TTL
+
+A reader takes a token before it reads the database and puts the value
+with it. The put is dropped if the key has been invalidated since the
+token was taken, so a value read just before a write cannot be cached
+after the invalidation of that write.
+"""
+from collections import OrderedDict
+from time import monotonic
+import threading
+
+
+class LRUCache:
+    """ Thread-safe, the least recently used entry goes first when full """
+
+    def __init__(self, maxsize: int, ttl: float, clock=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # invalidation stamps of the recent invalidations, the older ones
+        # are folded into the floor
+        self._invalidations = 0
+        self._invalidated = OrderedDict()
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def token(self) -> int:
+        return self._invalidations
+
+    def get(self, key):
+        """ The value or None """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, token: int):
+        with self._lock:
+            if token < self._floor or self._invalidated.get(key, 0) > token:
+                self.rejected += 1
+                return
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._invalidations += 1
+            for key in keys:
+                self._entries.pop(key, None)
+                self._invalidated[key] = self._invalidations
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._floor = self._invalidations
+            self._entries.clear()
+            self._invalidated.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+            }
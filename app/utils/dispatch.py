@@ -0,0 +1,120 @@
+"""
+Global dispatch of pending orders among idle couriers
+
+Unlike assign_orders, which serves couriers first come first served, the
+whole snapshot is solved at once. The exact problem (a generalized
+assignment problem) is NP-hard, so a greedy heuristic is used. Orders are
+placed lightest first, which maximizes the number of delivered orders,
+and within the same weight bucket the orders the fewest couriers can take
+go first. Each order goes to the fitting courier with the fewest
+alternatives, so broad couriers do not take the orders narrow couriers
+depend on.
+
+Couriers sharing a region, a capacity and a schedule are interchangeable
+for that region, so eligibility is computed once per such profile instead
+of once per courier.
+"""
+from typing import Dict, List
+from collections import defaultdict
+
+from utils.time import IntervalSet
+
+# orders within the same weight bucket (centi-kilograms) are placed in
+# the order of scarcity
+WEIGHT_BUCKET = 100
+
+
+class DispatchCourier:
+    __slots__ = ('courier_id', 'capacity', 'regions', 'working_hours',
+                 'slots', 'remaining', 'options')
+
+    def __init__(self, courier_id: int, capacity: int, regions: List[int],
+                 working_hours: IntervalSet):
+        self.courier_id = courier_id
+        self.capacity = capacity
+        self.regions = set(regions)
+        self.working_hours = working_hours
+        self.slots = working_hours.slot_masks()
+        self.remaining = capacity
+        # number of orders the courier could take
+        self.options = 0
+
+
+class DispatchOrder:
+    __slots__ = ('order_id', 'weight', 'region', 'delivery_hours', 'slots',
+                 'profiles', 'scarcity')
+
+    def __init__(self, order_id: int, weight: int, region: int,
+                 delivery_hours: IntervalSet, slots=None):
+        self.order_id = order_id
+        self.weight = weight
+        self.region = region
+        self.delivery_hours = delivery_hours
+        self.slots = slots or delivery_hours.slot_masks()
+        self.profiles = []
+        # number of couriers which could take the order
+        self.scarcity = 0
+
+
+class Profile:
+    __slots__ = ('couriers',)
+
+    def __init__(self):
+        self.couriers = []
+
+
+def eligible(courier: DispatchCourier, order: DispatchOrder) -> bool:
+    if order.weight > courier.capacity:
+        return False
+    if not (courier.slots[0] & order.slots[0] or courier.slots[1] & order.slots[1]):
+        return False
+    return courier.working_hours.overlaps(order.delivery_hours)
+
+
+def solve(couriers: List[DispatchCourier],
+          orders: List[DispatchOrder]) -> Dict[int, List[int]]:
+    """ Order ids per courier id, couriers left without orders are absent """
+    orders_by_region = defaultdict(list)
+    for order in orders:
+        orders_by_region[order.region].append(order)
+
+    profiles = defaultdict(Profile)
+    for courier in couriers:
+        for region in courier.regions:
+            if region in orders_by_region:
+                key = (region, courier.capacity, courier.working_hours.intervals)
+                profiles[key].couriers.append(courier)
+
+    for (region, _, _), profile in profiles.items():
+        model = profile.couriers[0]
+        options = 0
+        for order in orders_by_region[region]:
+            if eligible(model, order):
+                order.profiles.append(profile)
+                order.scarcity += len(profile.couriers)
+                options += 1
+        for courier in profile.couriers:
+            courier.options += options
+
+    for profile in profiles.values():
+        profile.couriers.sort(key=lambda c: c.options)
+
+    result = defaultdict(list)
+    queue = sorted(
+        (order for order in orders if order.scarcity),
+        key=lambda o: (o.weight // WEIGHT_BUCKET, o.scarcity, o.weight)
+    )
+    for order in queue:
+        best = None
+        for profile in order.profiles:
+            # couriers of a profile are sorted by the number of options,
+            # so the first fitting one is the narrowest one
+            for courier in profile.couriers:
+                if courier.remaining >= order.weight:
+                    if best is None or courier.options < best.options:
+                        best = courier
+                    break
+        if best is not None:
+            best.remaining -= order.weight
+            result[best.courier_id].append(order.order_id)
+    return dict(result)
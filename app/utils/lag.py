@@ -0,0 +1,63 @@
+"""
+Lag of a background job behind the events it has to handle
+
+The first event since the previous pass starts the clock. A pass takes
+everything that happened before it began and stops the clock once it
+has succeeded; a failed pass hands its events over to the next one.
+"""
+from typing import Optional
+from time import monotonic
+import threading
+
+
+class LagMeter:
+    """ Thread-safe, the times are in seconds """
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        # moment of the oldest event not taken by a pass yet
+        self._since = None
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+        self.max = 0.0
+
+    def event(self):
+        with self._lock:
+            if self._since is None:
+                self._since = self.clock()
+
+    def begin(self) -> Optional[float]:
+        """ Take the pending events, returns the token of the pass """
+        with self._lock:
+            since, self._since = self._since, None
+            return since
+
+    def done(self, since: Optional[float]):
+        if since is None:
+            return
+        lag = self.clock() - since
+        with self._lock:
+            self.count += 1
+            self.total += lag
+            self.last = lag
+            self.max = max(self.max, lag)
+
+    def failed(self, since: Optional[float]):
+        if since is None:
+            return
+        with self._lock:
+            if self._since is None or since < self._since:
+                self._since = since
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "last": self.last,
+                "max": self.max,
+                "mean": self.total / self.count if self.count else None,
+                # age of the oldest event still waiting for a pass
+                "waiting": self.clock() - self._since if self._since is not None else None,
+            }
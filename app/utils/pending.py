@@ -0,0 +1,124 @@
+"""
+Process-local index of the pending orders
+
+Maps a region to its pending orders sorted by weight, each with the parsed
+delivery hours and slot masks, so the candidates of a courier are found
+without a scan of the orders table. The index is only a hint: a claim is
+always confirmed in the database, and the orders it turns out to be wrong
+about are dropped from it.
+
+All methods are thread-safe and do no IO while holding the lock.
+"""
+from typing import Iterable, List, Tuple
+from bisect import bisect_right, insort
+from collections import defaultdict
+import heapq
+import threading
+
+from utils.selection import to_centikilos
+from utils.time import IntervalSet
+
+
+class PendingOrder:
+    __slots__ = ('order_id', 'weight', 'region', 'delivery_hours', 'slots',
+                 'key', 'seq')
+
+    def __init__(self, order_id: int, weight, region: int,
+                 delivery_hours: IntervalSet, slots: Tuple[int, int] = None):
+        self.order_id = order_id
+        self.weight = weight
+        self.region = region
+        self.delivery_hours = delivery_hours
+        self.slots = slots or delivery_hours.slot_masks()
+        self.key = (to_centikilos(weight), order_id)
+        # number of the change which put the order into the index
+        self.seq = 0
+
+    def __getitem__(self, name):
+        # rows and index entries are interchangeable for choose_orders
+        return getattr(self, name)
+
+
+class PendingIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # region -> sorted (centi-kilograms, order_id) keys
+        self._regions = defaultdict(list)
+        self._orders = {}
+        self._seq = 0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: int):
+        return order_id in self._orders
+
+    def mark(self) -> int:
+        """ Change number to pass to reset() along with a snapshot read after it """
+        with self._lock:
+            return self._seq
+
+    def reset(self, orders: Iterable[PendingOrder], mark: int = None):
+        """ Replace the content with a snapshot of the database
+
+        Orders added after the mark was taken are kept, as the snapshot
+        might have been read before they were committed.
+        """
+        with self._lock:
+            recent = [] if mark is None else [
+                order for order in self._orders.values() if order.seq > mark]
+            self._regions = defaultdict(list)
+            self._orders = {}
+            for order in orders:
+                self._add(order)
+            for order in recent:
+                self._add(order)
+            self.loaded = True
+
+    def add(self, orders: Iterable[PendingOrder]):
+        with self._lock:
+            self._seq += 1
+            for order in orders:
+                order.seq = self._seq
+                self._add(order)
+
+    def discard(self, order_ids: Iterable[int]):
+        with self._lock:
+            for order_id in order_ids:
+                self._discard(order_id)
+
+    def candidates(self, regions: List[int], max_weight,
+                   working_hours: IntervalSet) -> List[PendingOrder]:
+        """ Orders the courier may take, sorted by weight """
+        limit = (to_centikilos(max_weight), float('inf'))
+        slots_am, slots_pm = working_hours.slot_masks()
+        with self._lock:
+            keys = heapq.merge(*[
+                self._regions[r][:bisect_right(self._regions[r], limit)]
+                for r in set(regions) if r in self._regions
+            ])
+            result = []
+            for _, order_id in keys:
+                order = self._orders[order_id]
+                if not (order.slots[0] & slots_am or order.slots[1] & slots_pm):
+                    continue
+                if working_hours.overlaps(order.delivery_hours):
+                    result.append(order)
+            return result
+
+    def _add(self, order: PendingOrder):
+        self._discard(order.order_id)
+        self._orders[order.order_id] = order
+        insort(self._regions[order.region], order.key)
+
+    def _discard(self, order_id: int):
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return
+        keys = self._regions[order.region]
+        i = bisect_right(keys, order.key) - 1
+        del keys[i]
+        if not keys:
+            del self._regions[order.region]
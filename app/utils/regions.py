@@ -0,0 +1,84 @@
+"""
+Process-local reverse index from regions to the couriers serving them
+
+Backed by the courier_regions table, which the database can search by
+region, while couriers.regions keeps the API form of the list.
+
+All methods are thread-safe and do no IO while holding the lock.
+"""
+from typing import Iterable, Set, Tuple
+from collections import defaultdict
+import threading
+
+
+class RegionIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # region -> courier ids
+        self._couriers = defaultdict(set)
+        # courier id -> (regions, change number)
+        self._regions = {}
+        self._seq = 0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._regions)
+
+    def mark(self) -> int:
+        """ Change number to pass to reset() along with a snapshot read after it """
+        with self._lock:
+            return self._seq
+
+    def reset(self, pairs: Iterable[Tuple[int, int]], mark: int = None):
+        """ Replace the content with a snapshot of (courier_id, region) pairs
+
+        Couriers set after the mark was taken are kept as they are, as the
+        snapshot might have been read before they were committed.
+        """
+        snapshot = defaultdict(set)
+        for courier_id, region in pairs:
+            snapshot[courier_id].add(region)
+        with self._lock:
+            recent = {} if mark is None else {
+                courier_id: entry for courier_id, entry in self._regions.items()
+                if entry[1] > mark}
+            self._couriers = defaultdict(set)
+            self._regions = {}
+            for courier_id, regions in snapshot.items():
+                if courier_id not in recent:
+                    self._set(courier_id, regions, 0)
+            for courier_id, (regions, seq) in recent.items():
+                self._set(courier_id, regions, seq)
+            self.loaded = True
+
+    def set_regions(self, couriers: Iterable[Tuple[int, Iterable[int]]]):
+        """ Replace the regions of the (courier_id, regions) pairs """
+        with self._lock:
+            self._seq += 1
+            for courier_id, regions in couriers:
+                self._set(courier_id, set(regions), self._seq)
+
+    def couriers(self, regions: Iterable[int]) -> Set[int]:
+        """ Ids of the couriers serving any of the regions """
+        with self._lock:
+            result = set()
+            for region in regions:
+                result |= self._couriers.get(region, set())
+            return result
+
+    def regions(self, courier_id: int) -> Set[int]:
+        with self._lock:
+            entry = self._regions.get(courier_id)
+            return set(entry[0]) if entry else set()
+
+    def _set(self, courier_id: int, regions: Set[int], seq: int):
+        old = self._regions.get(courier_id)
+        if old is not None:
+            for region in old[0] - regions:
+                self._couriers[region].discard(courier_id)
+                if not self._couriers[region]:
+                    del self._couriers[region]
+        for region in regions:
+            self._couriers[region].add(courier_id)
+        self._regions[courier_id] = (regions, seq)
@@ -0,0 +1,135 @@
+"""
+Order selection strategies for a single delivery
+
+Every strategy takes the weights of the candidate orders (in centi-kilograms,
+sorted in ascending order) and the courier capacity, and returns the indices
+of the orders to deliver.
+"""
+from typing import List
+from time import perf_counter
+
+from config import settings, AssignObjectiveEnum, AssignStrategyEnum
+
+
+def to_centikilos(weight) -> int:
+    return round(weight * 100)
+
+
+def select_greedy(weights: List[int], capacity: int) -> List[int]:
+    """ Lightest orders first until the next one overflows the capacity
+
+    As the weights are sorted, this maximizes the number of orders, but
+    usually leaves a part of the capacity unused.
+    """
+    chosen = []
+    total = 0
+    for i, weight in enumerate(weights):
+        if total + weight > capacity:
+            break
+        chosen.append(i)
+        total += weight
+    return chosen
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def _check_deadline(deadline: float):
+    if perf_counter() > deadline:
+        raise DeadlineExceeded()
+
+
+def _knapsack_weight(weights: List[int], capacity: int,
+                     deadline: float) -> List[int]:
+    """ Max total weight subset, bitset of reachable sums per step """
+    limit = (1 << (capacity + 1)) - 1
+    reach = 1
+    history = []
+    for weight in weights:
+        _check_deadline(deadline)
+        history.append(reach)
+        reach |= (reach << weight) & limit
+
+    total = reach.bit_length() - 1
+    chosen = []
+    for i in range(len(weights) - 1, -1, -1):
+        if not (history[i] >> total) & 1:
+            chosen.append(i)
+            total -= weights[i]
+    return chosen[::-1]
+
+
+def _knapsack_count(weights: List[int], capacity: int,
+                    deadline: float) -> List[int]:
+    """ Max total weight among the subsets with the max number of orders
+
+    The max number of orders is known from the greedy choice, so only the
+    sums reachable with up to that many orders are tracked.
+    """
+    count = len(select_greedy(weights, capacity))
+    limit = (1 << (capacity + 1)) - 1
+    reach = [1] + [0] * count
+    history = []
+    for weight in weights:
+        _check_deadline(deadline)
+        history.append(reach[:])
+        for j in range(count, 0, -1):
+            reach[j] |= (reach[j - 1] << weight) & limit
+
+    total = reach[count].bit_length() - 1
+    chosen = []
+    j = count
+    for i in range(len(weights) - 1, -1, -1):
+        if not (history[i][j] >> total) & 1:
+            chosen.append(i)
+            total -= weights[i]
+            j -= 1
+    return chosen[::-1]
+
+
+def select_knapsack(weights: List[int], capacity: int,
+                    objective: AssignObjectiveEnum = AssignObjectiveEnum.count,
+                    max_candidates: int = 64,
+                    time_budget: float = 0.02) -> List[int]:
+    """ Capacity-optimal choice with a fallback to the greedy one
+
+    Falls back to greedy if there are more than max_candidates orders or
+    the solver does not fit into time_budget seconds.
+    """
+    if sum(weights) <= capacity:
+        return list(range(len(weights)))
+    if len(weights) > max_candidates:
+        return select_greedy(weights, capacity)
+
+    solver = _knapsack_count
+    if objective == AssignObjectiveEnum.weight:
+        solver = _knapsack_weight
+    try:
+        return solver(weights, capacity, perf_counter() + time_budget)
+    except DeadlineExceeded:
+        return select_greedy(weights, capacity)
+
+
+def candidates_needed() -> int:
+    """ Number of the lightest candidates the configured strategy needs
+
+    even if they do not fit into the capacity all together. The knapsack
+    gets one over its limit, which tells it to fall back to greedy.
+    """
+    if settings.assign_strategy == AssignStrategyEnum.knapsack:
+        return settings.knapsack_max_candidates + 1
+    return 0
+
+
+def select_orders(weights: List[int], capacity: int) -> List[int]:
+    """ Choice according to the configured strategy """
+    if settings.assign_strategy == AssignStrategyEnum.knapsack:
+        return select_knapsack(
+            weights,
+            capacity,
+            settings.assign_objective,
+            settings.knapsack_max_candidates,
+            settings.knapsack_time_budget
+        )
+    return select_greedy(weights, capacity)
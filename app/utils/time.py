@@ -1,60 +1,206 @@
-from typing import List
+from typing import Iterable, List, Tuple
 import re
 from datetime import datetime
 
+MINUTES_PER_DAY = 24 * 60
+
+# availability bitmasks: a day is split into 96 quarter-hour slots packed
+# into two 48-bit integers (before and after noon) to fit BIGINT columns
+SLOT_MINUTES = 15
+SLOTS_PER_HALF_DAY = MINUTES_PER_DAY // SLOT_MINUTES // 2
+HALF_DAY_MASK = (1 << SLOTS_PER_HALF_DAY) - 1
+
+HOURS_PATTERN = re.compile(r'^([0-9]{2}):([0-9]{2})-([0-9]{2}):([0-9]{2})$')
+
+
+def parse_minutes(hhmm: str) -> int:
+    """ Convert "HH:MM" into a minute of the day """
+    return int(hhmm[:2]) * 60 + int(hhmm[3:5])
+
+
+def format_minutes(minutes: int) -> str:
+    return '%02d:%02d' % divmod(minutes, 60)
+
+
+def minute_of_day(moment: datetime) -> int:
+    return moment.hour * 60 + moment.minute
+
 
 class TimeInterval:
-    def __init__(self, hours: str, adjust=False, current=None):
-        self.start, self.stop = hours.split("-")
-        if adjust and current:
-            # [.......]| => []
-            # [.......|  => []
-            if current >= self.stop:
-                self.start = self.stop
-            # [......|...] => |...]
-            elif current > self.start and current < self.stop:
-                self.start = current
+    """ "HH:MM-HH:MM" interval parsed into minutes of the day
+
+    Used as a pydantic field type, so the hours are parsed once on request
+    validation and then travel as minute integers down to the database.
+    """
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, hours: str) -> 'TimeInterval':
+        m = HOURS_PATTERN.match(hours)
+        if not m:
+            raise ValueError('wrong time interval format')
+        h1, m1, h2, m2 = [int(x) for x in m.groups()]
+        if h1 > 23 or h2 > 23 or m1 > 59 or m2 > 59:
+            raise ValueError('wrong time interval value')
+        return cls(h1 * 60 + m1, h2 * 60 + m2)
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema):
+        field_schema.update(type='string', pattern=HOURS_PATTERN.pattern,
+                            example='09:00-18:00')
+
+    @classmethod
+    def validate(cls, v):
+        if isinstance(v, cls):
+            return v
+        if not isinstance(v, str):
+            raise TypeError('string required')
+        return cls.parse(v)
+
+    def __iter__(self):
+        yield self.start
+        yield self.end
+
+    def __eq__(self, other):
+        return (isinstance(other, TimeInterval) and
+                self.start == other.start and self.end == other.end)
 
     def __str__(self):
-        return f'{self.start}-{self.stop}'
+        return f'{format_minutes(self.start)}-{format_minutes(self.end)}'
 
     def __repr__(self):
-        return f'{self.start}-{self.stop}'
+        return f'TimeInterval({self})'
+
+
+def dump_hours(hours: Iterable[TimeInterval]) -> List[List[int]]:
+    """ Storage form of the hours: a list of [start, end] minute pairs """
+    return [[start, end] for start, end in hours]
+
+
+def load_hours(stored: Iterable) -> List[TimeInterval]:
+    return [TimeInterval(start, end) for start, end in stored]
+
+
+def format_hours(stored: Iterable) -> List[str]:
+    """ API form of the stored hours: a list of "HH:MM-HH:MM" strings """
+    return [str(x) for x in load_hours(stored)]
 
 
-def get_adjusted_time_intervals(hours: List[str], current_time):
-    result = []
-    for interval in hours:
-        tmp = TimeInterval(interval, True, current_time)
-        if tmp.start != tmp.stop:
-            result.append(tmp)
-    return result
+class IntervalSet:
+    """ Sorted, merged set of [start, end) minute-of-day intervals
+
+    Intervals are normalized once on construction, so the overlap test is
+    a single merge sweep over both sets. An interval which wraps past
+    midnight ("22:00-02:00") is split into two parts, an empty one
+    ("10:00-10:00") is dropped.
+    """
+
+    __slots__ = ('intervals',)
+
+    def __init__(self, pairs: Iterable[Tuple[int, int]] = ()):
+        spans = []
+        for start, end in pairs:
+            if start < end:
+                spans.append((start, end))
+            elif start > end:
+                spans.append((start, MINUTES_PER_DAY))
+                if end:
+                    spans.append((0, end))
+        spans.sort()
+
+        merged = []
+        for start, end in spans:
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        self.intervals = tuple(merged)
+
+    @classmethod
+    def from_strings(cls, hours: Iterable[str]) -> 'IntervalSet':
+        return cls((parse_minutes(x[:5]), parse_minutes(x[6:])) for x in hours)
+
+    def clip(self, now: int) -> 'IntervalSet':
+        """ Drop everything before the given minute of the day
+
+        [.......]|    => []
+        [......|...]  => |...]
+        """
+        result = IntervalSet.__new__(IntervalSet)
+        result.intervals = tuple(
+            (start if start > now else now, end)
+            for start, end in self.intervals if end > now
+        )
+        return result
+
+    def slot_masks(self) -> Tuple[int, int]:
+        """ Bitmasks of the quarter-hour slots touched by the intervals
+
+        Two sets may overlap only if their masks share a bit, so the masks
+        are a cheap (SQL-side) prefilter before the exact overlap test.
+        """
+        mask = 0
+        for start, end in self.intervals:
+            first, last = start // SLOT_MINUTES, (end - 1) // SLOT_MINUTES
+            mask |= ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+        return mask & HALF_DAY_MASK, mask >> SLOTS_PER_HALF_DAY
+
+    def overlaps(self, other: 'IntervalSet') -> bool:
+        a, b = self.intervals, other.intervals
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if a[i][0] < b[j][1] and b[j][0] < a[i][1]:
+                return True
+            # advance the interval which finishes first
+            if a[i][1] <= b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return False
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __eq__(self, other):
+        return (isinstance(other, IntervalSet) and
+                self.intervals == other.intervals)
+
+    def __repr__(self):
+        return f'IntervalSet({list(self.intervals)!r})'
 
 
 def can_be_delivered_in_time(current_time: str,
                              courier_hours: List[str],
                              delivery_hours: List[str]):
-    c_h = get_adjusted_time_intervals(courier_hours, current_time)
-    d_h = get_adjusted_time_intervals(delivery_hours, current_time)
-    if not c_h or not d_h:
-        return False
-    for courier_interval in c_h:
-        for delivery_interval in d_h:
-            if (courier_interval.start < delivery_interval.stop) and (
-                courier_interval.stop > delivery_interval.start):
-                return True
-    return False
+    # clipping the courier hours only is enough: an overlap with the
+    # clipped schedule always lies after the current time
+    now = parse_minutes(current_time)
+    return IntervalSet.from_strings(courier_hours).clip(now).overlaps(
+        IntervalSet.from_strings(delivery_hours))
 
 
 def validate_hours_input(wh: List[str]):
-    p = re.compile(r'^\d{2}:\d{2}-\d{2}:\d{2}$')
-    for interval in wh:
-        if not p.match(interval):
-            return False
-        try:
-            tmp = [datetime.strptime(x, "%H:%M") for x in re.split("-", interval)]
-        except ValueError:
-            return False
+    try:
+        for interval in wh:
+            TimeInterval.parse(interval)
+    except ValueError:
+        return False
     return True
 
 
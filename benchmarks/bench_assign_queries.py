@@ -0,0 +1,103 @@
+"""
+Candidate queries of assign_orders on deep backlogs
+
+    python3 bench_assign_queries.py [--url URL] [--backlog N ...]
+
+Compares the full candidate scan with the running-weight window query
+(rows and bytes sent over, time) and counts the statements of a whole
+assign_orders call. The tables behind URL are recreated, an in-memory
+SQLite database is used by default.
+"""
+import sys
+sys.path.append("../app")
+
+import argparse
+import random
+from time import perf_counter
+
+from sqlalchemy import create_engine, event
+
+from db.orders import assign_orders
+from db.queries import select_candidate_orders, select_fitting_orders
+from db.schema import (
+    hours_values, metadata, tbl_couriers, tbl_orders, tbl_order_windows,
+    window_values
+)
+from utils.selection import candidates_needed
+from utils.time import IntervalSet
+
+DAY = IntervalSet([(0, 1439)])
+REGIONS = [1, 2, 3]
+MAX_WEIGHT = 50
+
+
+def seed(engine, backlog: int):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(tbl_orders.insert(), [
+            dict(order_id=i, weight=round(random.uniform(0.01, 10), 2),
+                 region=random.choice(REGIONS),
+                 **hours_values('delivery_hours', [(480, 1320)]))
+            for i in range(1, backlog + 1)
+        ])
+        connection.execute(tbl_order_windows.insert(), [
+            w for i in range(1, backlog + 1)
+            for w in window_values(i, [(480, 1320)])
+        ])
+
+
+def measure(engine, query, repeat: int):
+    with engine.connect() as connection:
+        started = perf_counter()
+        for _ in range(repeat):
+            rows = connection.execute(query).fetchall()
+        elapsed = (perf_counter() - started) / repeat
+    size = sum(len(str(value)) for row in rows for value in row)
+    return len(rows), size, elapsed
+
+
+def count_statements(engine) -> int:
+    statements = []
+
+    def before_cursor_execute(*args):
+        statements.append(args[2])
+
+    with engine.connect() as connection:
+        connection.execute(tbl_couriers.insert(), dict(
+            courier_id=1, courier_type='car', regions=REGIONS,
+            **hours_values('working_hours', [(0, 1439)])))
+        event.listen(connection, 'before_cursor_execute', before_cursor_execute)
+        with connection.begin():
+            assign_orders(connection, 1)
+        event.remove(connection, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Candidate queries benchmark')
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--backlog', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    engine = create_engine(args.url)
+
+    print('%8s %-8s %8s %10s %10s' % ('backlog', 'query', 'rows', 'bytes', 'ms'))
+    for backlog in args.backlog:
+        seed(engine, backlog)
+        queries = [
+            ('scan', select_candidate_orders(REGIONS, MAX_WEIGHT, DAY)),
+            ('window', select_fitting_orders(REGIONS, MAX_WEIGHT, DAY,
+                                             candidates_needed())),
+        ]
+        for name, query in queries:
+            rows, size, elapsed = measure(engine, query, args.repeat)
+            print('%8d %-8s %8d %10d %10.2f' % (
+                backlog, name, rows, size, elapsed * 1000))
+        print('%8d statements per assign_orders call: %d' % (
+            backlog, count_statements(engine)))
+
+
+if __name__ == "__main__":
+    main()
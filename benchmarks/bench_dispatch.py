@@ -0,0 +1,91 @@
+"""
+Global dispatch vs first come first served assignment on synthetic snapshots
+
+    python3 bench_dispatch.py [--orders N ...] [--couriers N] [--regions N]
+"""
+import sys
+sys.path.append("../app")
+
+import argparse
+import random
+from time import perf_counter
+
+from schemas.couriers import CourierTypeEnum
+from utils.dispatch import DispatchCourier, DispatchOrder, eligible, solve
+from utils.selection import select_orders
+from utils.time import IntervalSet
+
+SHIFTS = [[(540, 1080)], [(480, 720)], [(720, 1200)], [(600, 900), (960, 1320)]]
+
+
+def snapshot(n_orders: int, n_couriers: int, n_regions: int):
+    couriers = []
+    for courier_id in range(1, n_couriers + 1):
+        courier_type = random.choice(list(CourierTypeEnum))
+        # a few broad couriers, mostly narrow ones
+        regions = random.sample(range(n_regions), random.choice([1, 1, 2, 3, 8]))
+        couriers.append(DispatchCourier(
+            courier_id,
+            CourierTypeEnum.max_weight(courier_type) * 100,
+            regions,
+            IntervalSet(random.choice(SHIFTS))
+        ))
+    orders = []
+    for order_id in range(1, n_orders + 1):
+        start = random.randrange(480, 1260)
+        orders.append(DispatchOrder(
+            order_id,
+            min(5000, max(1, int(random.expovariate(1 / 400)))),
+            random.randrange(n_regions),
+            IntervalSet([(start, start + random.choice([30, 60, 120]))])
+        ))
+    return couriers, orders
+
+
+def first_come_first_served(couriers, orders):
+    """ Couriers take their orders one after another, as assign_orders does """
+    by_region = {}
+    for order in sorted(orders, key=lambda o: o.weight):
+        by_region.setdefault(order.region, []).append(order)
+    taken = set()
+    assigned = 0
+    for courier in random.sample(couriers, len(couriers)):
+        candidates = sorted(
+            (o for r in courier.regions for o in by_region.get(r, [])
+             if o.order_id not in taken and eligible(courier, o)),
+            key=lambda o: o.weight)
+        chosen = select_orders([o.weight for o in candidates], courier.capacity)
+        taken.update(candidates[i].order_id for i in chosen)
+        assigned += len(chosen)
+    return assigned
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000, 10000, 30000])
+    parser.add_argument('--couriers', type=int, default=None,
+                        help='default: a courier per 10 orders')
+    parser.add_argument('--regions', type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f'{"orders":>7} {"couriers":>8} {"fcfs":>7} {"fcfs s":>7} '
+          f'{"global":>7} {"global s":>8}')
+    for n_orders in args.orders:
+        n_couriers = args.couriers or n_orders // 10
+        couriers, orders = snapshot(n_orders, n_couriers, args.regions)
+
+        started = perf_counter()
+        fcfs = first_come_first_served(couriers, orders)
+        fcfs_time = perf_counter() - started
+
+        started = perf_counter()
+        result = solve(couriers, orders)
+        solve_time = perf_counter() - started
+        assigned = sum(len(x) for x in result.values())
+        print(f'{n_orders:7} {n_couriers:8} {fcfs:7} {fcfs_time:7.2f} '
+              f'{assigned:7} {solve_time:8.2f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Load test of a running service, to compare the sync and async db modes
+
+    DATABASE_ASYNC=false uvicorn main:app --port 8080    (in app/)
+    python3 bench_load.py --seed
+    DATABASE_ASYNC=true uvicorn main:app --port 8080
+    python3 bench_load.py --seed
+
+Every client holds its own keep-alive connection and mixes courier
+lookups with assignment requests. --seed recreates the couriers and the
+orders first (on a freshly initialized database).
+"""
+import argparse
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import requests
+
+SHIFTS = ["08:00-12:00", "09:00-18:00", "12:00-20:00", "00:00-23:59"]
+
+
+def seed(url: str, n_couriers: int, n_orders: int, offset: int):
+    session = requests.Session()
+    for start in range(0, n_couriers, 1000):
+        session.post(url + "/couriers", json={"data": [
+            {
+                "courier_id": offset + i,
+                "courier_type": random.choice(["foot", "bike", "car"]),
+                "regions": random.sample(range(1, 21), 2),
+                "working_hours": [random.choice(SHIFTS)]
+            }
+            for i in range(start + 1, min(start + 1000, n_couriers) + 1)
+        ]}).raise_for_status()
+    for start in range(0, n_orders, 1000):
+        session.post(url + "/orders", json={"data": [
+            {
+                "order_id": offset + i,
+                "weight": round(random.uniform(0.01, 10), 2),
+                "region": random.randint(1, 20),
+                "delivery_hours": [random.choice(SHIFTS)]
+            }
+            for i in range(start + 1, min(start + 1000, n_orders) + 1)
+        ]}).raise_for_status()
+
+
+def client(url: str, n_couriers: int, offset: int, requests_per_client: int):
+    session = requests.Session()
+    latencies = []
+    errors = 0
+    for _ in range(requests_per_client):
+        courier_id = offset + random.randint(1, n_couriers)
+        started = perf_counter()
+        if random.random() < 0.5:
+            response = session.get("%s/couriers/%d" % (url, courier_id))
+        else:
+            response = session.post(url + "/orders/assign",
+                                    json={"courier_id": courier_id})
+        latencies.append(perf_counter() - started)
+        if response.status_code != 200:
+            errors += 1
+    return latencies, errors
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Yapi load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--requests', type=int, default=20,
+                        help='requests per client')
+    parser.add_argument('--couriers', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--offset', type=int, default=1000000,
+                        help='first courier and order id')
+    parser.add_argument('--seed', action='store_true')
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.url, args.couriers, args.orders, args.offset)
+
+    print('%8s %10s %10s %10s %10s %8s' % (
+        'clients', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for n_clients in args.clients:
+        barrier = threading.Barrier(n_clients)
+
+        def run(_):
+            barrier.wait()
+            return client(args.url, args.couriers, args.offset, args.requests)
+
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=n_clients) as executor:
+            results = list(executor.map(run, range(n_clients)))
+        elapsed = perf_counter() - started
+
+        latencies = sorted(x for lat, _ in results for x in lat)
+        print('%8d %10.1f %10.1f %10.1f %10.1f %8d' % (
+            n_clients,
+            len(latencies) / elapsed,
+            percentile(latencies, 0.50) * 1000,
+            percentile(latencies, 0.95) * 1000,
+            percentile(latencies, 0.99) * 1000,
+            sum(errors for _, errors in results)
+        ))
+
+
+if __name__ == "__main__":
+    main()
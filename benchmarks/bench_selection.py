@@ -0,0 +1,61 @@
+"""
+Order selection strategies: orders and weight per delivery, solver latency
+
+    python3 bench_selection.py [--candidates N] [--rounds N]
+"""
+import sys
+sys.path.append("../app")
+
+import argparse
+import random
+from statistics import mean
+from time import perf_counter
+
+from config import AssignObjectiveEnum
+from schemas.couriers import CourierTypeEnum
+from utils.selection import select_greedy, select_knapsack
+
+STRATEGIES = [
+    ('greedy', lambda w, c: select_greedy(w, c)),
+    ('knapsack/count', lambda w, c: select_knapsack(
+        w, c, AssignObjectiveEnum.count, max_candidates=10 ** 6, time_budget=10)),
+    ('knapsack/weight', lambda w, c: select_knapsack(
+        w, c, AssignObjectiveEnum.weight, max_candidates=10 ** 6, time_budget=10)),
+]
+
+
+def random_weights(n: int, capacity: int):
+    # mostly light parcels with a tail of heavy ones
+    return sorted(
+        min(capacity, max(1, int(random.expovariate(1 / 300))))
+        for _ in range(n)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, nargs='+', default=[8, 32, 64, 128])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f'{"courier":8} {"cand.":>5} {"strategy":16} {"orders":>7} '
+          f'{"load %":>7} {"mean ms":>8} {"max ms":>8}')
+    for courier_type in CourierTypeEnum:
+        capacity = CourierTypeEnum.max_weight(courier_type) * 100
+        for n in args.candidates:
+            samples = [random_weights(n, capacity) for _ in range(args.rounds)]
+            for name, strategy in STRATEGIES:
+                orders, loads, timings = [], [], []
+                for weights in samples:
+                    started = perf_counter()
+                    chosen = strategy(weights, capacity)
+                    timings.append((perf_counter() - started) * 1000)
+                    orders.append(len(chosen))
+                    loads.append(100 * sum(weights[i] for i in chosen) / capacity)
+                print(f'{courier_type.value:8} {n:5} {name:16} {mean(orders):7.2f} '
+                      f'{mean(loads):7.2f} {mean(timings):8.3f} {max(timings):8.3f}')
+
+
+if __name__ == "__main__":
+    main()
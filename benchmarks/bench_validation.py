@@ -0,0 +1,99 @@
+"""
+Validation of the bulk POST payloads: per-item cost before and after
+
+    python3 bench_validation.py [--items N ...] [--repeat N]
+
+"before" is the former two-model path (the permissive request model, then
+the strict item model per item), "after" is the single pass of
+schemas/bulk.py. Every payload has one percent of bad items.
+"""
+import sys
+sys.path.append("../app")
+
+import argparse
+import random
+from time import perf_counter
+from typing import List
+
+from pydantic import BaseModel, ValidationError
+
+from schemas.bulk import validate_couriers, validate_orders
+from schemas.couriers import CourierItem, CourierKindaItem
+from schemas.orders import OrderItem, OrderKindaItem
+
+
+class CouriersPostRequest(BaseModel):
+    data: List[CourierKindaItem]
+
+
+class OrdersPostRequest(BaseModel):
+    data: List[OrderKindaItem]
+
+
+def two_models(request_model, item_model):
+    def validate(body):
+        good, bad = [], []
+        for kinda_item in request_model.parse_obj(body).data:
+            try:
+                good.append(item_model(**kinda_item.dict()))
+            except ValidationError:
+                bad.append(kinda_item)
+        return good, bad
+    return validate
+
+
+def random_hours():
+    start = random.randrange(0, 20 * 60, 5)
+    return '%02d:%02d-%02d:%02d' % (*divmod(start, 60), *divmod(start + 180, 60))
+
+
+def couriers(n: int):
+    return {"data": [
+        {"courier_id": i, "courier_type": random.choice(["foot", "bike", "car"]),
+         "regions": random.sample(range(1, 50), 3),
+         "working_hours": [random_hours(), random_hours()] if i % 100 else ["bad"]}
+        for i in range(1, n + 1)
+    ]}
+
+
+def orders(n: int):
+    return {"data": [
+        {"order_id": i, "weight": round(random.uniform(0.01, 50), 2),
+         "region": random.randint(1, 50),
+         "delivery_hours": [random_hours()] if i % 100 else ["bad"]}
+        for i in range(1, n + 1)
+    ]}
+
+
+def measure(validate, body, repeat: int) -> float:
+    started = perf_counter()
+    for _ in range(repeat):
+        validate(body)
+    return (perf_counter() - started) / repeat / len(body["data"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk validation benchmark')
+    parser.add_argument('--items', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        ('couriers', couriers, two_models(CouriersPostRequest, CourierItem),
+         validate_couriers),
+        ('orders', orders, two_models(OrdersPostRequest, OrderItem),
+         validate_orders),
+    ]
+    print('%-9s %8s %12s %12s %8s' % ('payload', 'items', 'before, us',
+                                      'after, us', 'speedup'))
+    for name, payload, before, after in cases:
+        for n in args.items:
+            body = payload(n)
+            us_before = measure(before, body, args.repeat) * 10 ** 6
+            us_after = measure(after, body, args.repeat) * 10 ** 6
+            print('%-9s %8d %12.2f %12.2f %7.1fx' % (
+                name, n, us_before, us_after, us_before / us_after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+import warnings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from config import settings
+from sqlalchemy import create_engine, select
+
+COURIERS = 40
+ORDERS = 300
+THREADS = 16
+
+engine = create_engine(settings.database_url)
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name == 'sqlite',
+    reason="SQLite has no row-level locks")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    from db.schema import metadata
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def test_concurrent_assign():
+    from schemas.couriers import CourierItem
+    from schemas.orders import OrderItem
+    from db.db import run_in_transaction
+    from db.couriers import save_posted_couriers
+    from db.orders import save_posted_orders, assign_orders
+    from db.schema import tbl_deliveries, tbl_deliveries_orders
+
+    run_in_transaction(save_posted_couriers, [
+        CourierItem(courier_id=i, courier_type="car", regions=[1, 2],
+                    working_hours=["00:00-23:59"]).dict()
+        for i in range(1, COURIERS + 1)
+    ])
+    run_in_transaction(save_posted_orders, [
+        OrderItem(order_id=i, weight=0.5 + i % 7, region=1 + i % 2,
+                  delivery_hours=["00:00-23:59"]).dict()
+        for i in range(1, ORDERS + 1)
+    ])
+
+    # every courier asks twice at once, the second request of a courier
+    # must get the same delivery back
+    requests = list(range(1, COURIERS + 1)) * 2
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(
+            lambda courier_id: run_in_transaction(assign_orders, courier_id),
+            requests))
+    elapsed = perf_counter() - started
+    # shown in the warnings summary, captured output or not
+    warnings.warn("%d assignments in %.3fs, %.1f/s" % (
+        len(requests), elapsed, len(requests) / elapsed))
+
+    with engine.connect() as connection:
+        deliveries = Counter(
+            row[0] for row in connection.execute(
+                select([tbl_deliveries.c.courier_id])))
+        orders = Counter(
+            row[0] for row in connection.execute(
+                select([tbl_deliveries_orders.c.order_id])))
+
+    assert all(n == 1 for n in deliveries.values())
+    assert all(n == 1 for n in orders.values())
+
+    # the orders weigh about half of the total capacity, so the couriers
+    # served after the pool has run out get nothing
+    by_courier = {}
+    for courier_id, result in zip(requests, results):
+        ids = sorted(x["id"] for x in result["orders"]) if result else []
+        assert by_courier.setdefault(courier_id, ids) == ids
+    assert sum(len(x) for x in by_courier.values()) == len(orders)
+    assert len(orders) == ORDERS
@@ -0,0 +1,112 @@
+import sys
+sys.path.append("../app")
+
+import asyncio
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine
+
+from db.auto_dispatch import AutoDispatcher
+from db.orders import dispatch_lag
+from db.db import async_engine, run_in_transaction
+from db.orders import assign_idle_couriers
+from db.regions import load_region_index
+from db.schema import metadata
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    run_in_transaction(load_region_index)
+    client.post("/couriers", json={"data": [
+        {"courier_id": i, "courier_type": "foot", "regions": [i],
+         "working_hours": ["00:00-23:59"]} for i in (1, 2, 3)
+    ]})
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def post_order(order_id: int, region: int):
+    client.post("/orders", json={"data": [
+        {"order_id": order_id, "weight": 1, "region": region,
+         "delivery_hours": ["00:00-23:59"]}
+    ]})
+
+
+def run_dispatcher(interval: float, batch_size: int, done, timeout: float = 10):
+    """ Run a dispatcher till done(dispatcher), a failed pass or the timeout """
+    async def run():
+        dispatcher = AutoDispatcher()
+        dispatcher.start(interval, batch_size)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        try:
+            while (not done(dispatcher) and not dispatcher.failures and
+                   loop.time() < deadline):
+                await asyncio.sleep(0.01)
+        finally:
+            await dispatcher.stop()
+            # the pooled connections belong to the loop of this run
+            if async_engine is not None:
+                await async_engine.dispose()
+        return dispatcher
+
+    return asyncio.run(run())
+
+
+def test_assign_returns_the_dispatched_delivery():
+    post_order(1, 1)
+    post_order(2, 3)
+    # courier 2 has no orders in the region, so it is not visited
+    metrics = run_in_transaction(assign_idle_couriers, 0, 1)
+    assert metrics["idle_couriers"] == 1 and metrics["assigned_orders"] == 1
+    assert metrics["last_courier_id"] == 1
+    metrics = run_in_transaction(assign_idle_couriers, 1, 1)
+    assert metrics["assigned_orders"] == 1
+    assert metrics["last_courier_id"] == 3
+
+    first = client.post("/orders/assign", json={"courier_id": 3}).json()
+    again = client.post("/orders/assign", json={"courier_id": 3}).json()
+    assert first["orders"] == [{"id": 2}]
+    assert first == again
+
+
+def test_dispatcher_task():
+    post_order(3, 2)
+
+    dispatcher = run_dispatcher(0.01, 10, lambda x: x.passes)
+    assert not dispatcher.failures and dispatcher.passes
+    assert not dispatcher.running
+    assert dispatcher.last_pass["assigned_orders"] == 1
+    response = client.post("/orders/assign", json={"courier_id": 2})
+    assert response.json()["orders"] == [{"id": 3}]
+
+    stats = client.get("/internal/dispatcher").json()
+    assert stats["enabled"] is False and stats["running"] is False
+
+
+def test_lag_measured_over_a_full_sweep():
+    client.post("/couriers", json={"data": [
+        {"courier_id": i, "courier_type": "foot", "regions": [i],
+         "working_hours": ["00:00-23:59"]} for i in (4, 5, 6)
+    ]})
+    for i in (4, 5, 6):
+        post_order(i, i)
+    count = dispatch_lag.stats()["count"]
+    dispatch_lag.event()
+
+    # a courier per pass, the sweep ends with an empty page
+    dispatcher = run_dispatcher(0.01, 1, lambda x: x.sweeps)
+    assert not dispatcher.failures and dispatcher.sweeps
+    assert dispatcher.passes >= 4
+    assert dispatch_lag.stats()["count"] == count + dispatcher.sweeps
+
@@ -0,0 +1,54 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from config import settings
+from sqlalchemy import create_engine, select
+
+import db.bulk
+from db.bulk import insert_new_rows
+from db.schema import metadata, tbl_couriers
+
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(db.bulk, 'INSERT_CHUNK_SIZE', 4)
+
+
+def couriers(*ids, courier_type="foot"):
+    return [dict(courier_id=i, courier_type=courier_type, regions=[1],
+                 working_hours=[]) for i in ids]
+
+
+def insert(rows):
+    with engine.begin() as connection:
+        return insert_new_rows(connection, tbl_couriers, 'courier_id', rows)
+
+
+def test_new_rows(small_chunks):
+    assert insert(couriers(1, 2, 3, 4, 5, 6)) == [1, 2, 3, 4, 5, 6]
+
+
+def test_existing_and_repeated_rows(small_chunks):
+    # chunks: all known, mixed, mixed with a repeated key, single new
+    rows = couriers(1, 2, 3, 4, 7, 5, 8, 6, 9, 9, 10, 11, 12, courier_type="car")
+    assert insert(rows) == [7, 8, 9, 10, 11, 12]
+    with engine.connect() as connection:
+        result = connection.execute(select([tbl_couriers.c.courier_id,
+                                            tbl_couriers.c.courier_type]))
+        types = dict(result.fetchall())
+    assert len(types) == 12
+    # the existing ones are left intact
+    assert types[1] == "foot" and types[7] == "car"
@@ -0,0 +1,64 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine
+
+from db.courier_cache import courier_cache
+from db.schema import metadata, tbl_couriers
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    courier_cache.clear()
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def stats():
+    return client.get("/internal/courier-cache").json()
+
+
+def test_read_through():
+    client.post("/couriers", json={"data": [
+        {"courier_id": 1, "courier_type": "foot", "regions": [1],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    before = stats()
+    for _ in range(3):
+        assert client.get("/couriers/1").json()["courier_type"] == "foot"
+    after = stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+
+
+def test_invalidated_on_update():
+    client.patch("/couriers/1", json={"courier_type": "car"})
+    assert client.get("/couriers/1").json()["courier_type"] == "car"
+
+
+def test_assign_rereads_another_version():
+    # a change made by another process leaves the cached profile behind
+    with engine.begin() as connection:
+        connection.execute(tbl_couriers.update().values(
+            regions=[2], version=tbl_couriers.c.version + 1))
+    assert client.get("/couriers/1").json()["regions"] == [1]
+
+    client.post("/orders", json={"data": [
+        {"order_id": 1, "weight": 1, "region": 2,
+         "delivery_hours": ["00:00-23:59"]}
+    ]})
+    response = client.post("/orders/assign", json={"courier_id": 1})
+    assert [x["id"] for x in response.json()["orders"]] == [1]
+    assert client.get("/couriers/1").json()["regions"] == [2]
@@ -0,0 +1,106 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine, select
+
+from db.schema import metadata, tbl_deliveries
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+COMPLETE_TIME = "2021-01-10T10:33:01.42Z"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def deliveries(courier_id):
+    with engine.connect() as connection:
+        return [dict(row) for row in connection.execute(select([
+            tbl_deliveries.c.status,
+            tbl_deliveries.c.total_orders,
+            tbl_deliveries.c.remaining_orders
+        ]).where(tbl_deliveries.c.courier_id == courier_id))]
+
+
+def assign(courier_id, order_ids):
+    client.post("/couriers", json={"data": [
+        {"courier_id": courier_id, "courier_type": "car", "regions": [1, 2],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    client.post("/orders", json={"data": [
+        {"order_id": i, "weight": 1, "region": 1 + i % 2,
+         "delivery_hours": ["00:00-23:59"]} for i in order_ids
+    ]})
+    response = client.post("/orders/assign", json={"courier_id": courier_id})
+    assert [x["id"] for x in response.json()["orders"]] == order_ids
+
+
+def complete(courier_id, order_id):
+    response = client.post("/orders/complete", json={
+        "courier_id": courier_id, "order_id": order_id,
+        "complete_time": COMPLETE_TIME})
+    assert response.status_code == 200
+
+
+def test_counted_down_on_completion():
+    assign(1, [1, 2, 3])
+    assert deliveries(1) == [
+        {"status": "assigned", "total_orders": 3, "remaining_orders": 3}]
+    complete(1, 1)
+    complete(1, 1)
+    assert deliveries(1) == [
+        {"status": "assigned", "total_orders": 3, "remaining_orders": 2}]
+    complete(1, 2)
+    complete(1, 3)
+    assert deliveries(1) == [
+        {"status": "completed", "total_orders": 3, "remaining_orders": 0}]
+    assert client.get("/couriers/1").json()["earnings"] == 9 * 500
+
+
+def test_released_orders_finish_the_delivery():
+    # order 5 (region 2) is released, the rest is completed
+    assign(2, [4, 5])
+    complete(2, 4)
+    client.patch("/couriers/2", json={"regions": [1]})
+    assert deliveries(2) == [
+        {"status": "completed", "total_orders": 1, "remaining_orders": 0}]
+    assert client.get("/couriers/2").json()["earnings"] == 9 * 500
+
+
+def test_emptied_delivery_is_deleted():
+    # order 5 released before is taken as well
+    assign(3, [5, 6, 8])
+    client.patch("/couriers/3", json={"regions": [3]})
+    assert deliveries(3) == []
+    assert client.get("/couriers/3").json()["earnings"] == 0
+
+
+def test_capacity_shrinks():
+    client.post("/couriers", json={"data": [
+        {"courier_id": 4, "courier_type": "car", "regions": [4],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    client.post("/orders", json={"data": [
+        {"order_id": i, "weight": 4.5, "region": 4,
+         "delivery_hours": ["00:00-23:59"]} for i in (10, 11, 12)
+    ]})
+    client.post("/orders/assign", json={"courier_id": 4})
+    # two orders fit a foot courier, the third one is released
+    client.patch("/couriers/4", json={"courier_type": "foot"})
+    assert deliveries(4) == [
+        {"status": "assigned", "total_orders": 2, "remaining_orders": 2}]
+    response = client.post("/orders/assign", json={"courier_id": 4})
+    assert [x["id"] for x in response.json()["orders"]] == [10, 11]
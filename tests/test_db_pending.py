@@ -0,0 +1,60 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+from time import monotonic, sleep
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine
+
+from db.pending import get_pending_index, pending_index, pending_resync
+from db.schema import (
+    hours_values, metadata, tbl_orders, tbl_order_windows, window_values
+)
+from utils.time import IntervalSet
+
+DAY = IntervalSet([(0, 1439)])
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    pending_resync.reload()
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def test_falls_back_to_the_scan():
+    client.post("/couriers", json={"data": [
+        {"courier_id": 1, "courier_type": "foot", "regions": [1],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    # posted through another process, so unknown to the index
+    with engine.begin() as connection:
+        connection.execute(tbl_orders.insert(), [dict(
+            order_id=1, weight=1, region=1,
+            **hours_values('delivery_hours', [(0, 1439)]))])
+        connection.execute(tbl_order_windows.insert(), window_values(1, [(0, 1439)]))
+    assert not list(get_pending_index().candidates([1], 10, DAY))
+
+    response = client.post("/orders/assign", json={"courier_id": 1})
+    assert response.json()["orders"] == [{"id": 1}]
+
+
+def test_resynced_in_the_background(monkeypatch):
+    monkeypatch.setattr(settings, "pending_index_ttl", 0)
+    loaded_at = pending_resync.loaded_at
+    # the stale index is returned right away, the reload goes on aside
+    assert get_pending_index() is pending_index
+    deadline = monotonic() + 10
+    while pending_resync.loaded_at == loaded_at and monotonic() < deadline:
+        sleep(0.01)
+    assert pending_resync.loaded_at != loaded_at
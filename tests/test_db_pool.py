@@ -0,0 +1,52 @@
+import sys
+sys.path.append("../app")
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import exc
+
+from db.pool import InstrumentedQueuePool, pool_stats
+from main import app
+
+
+client = TestClient(app)
+
+
+def make_pool():
+    return InstrumentedQueuePool(
+        lambda: sqlite3.connect(':memory:', check_same_thread=False),
+        pool_size=1, max_overflow=1, timeout=0.05)
+
+
+def test_checkouts_and_overflow_are_counted():
+    pool = make_pool()
+    first = pool.connect()
+    second = pool.connect()
+    stats = pool_stats(pool)
+    assert stats["checkouts"] == 2
+    assert stats["checked_out"] == 2
+    assert stats["overflow"] == 1
+    first.close()
+    second.close()
+    assert pool_stats(pool)["checked_out"] == 0
+
+
+def test_timeouts_are_counted_with_the_wait():
+    pool = make_pool()
+    held = [pool.connect(), pool.connect()]
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    stats = pool_stats(pool)
+    assert stats["timeouts"] == 1
+    assert stats["checkouts"] == 3
+    assert stats["wait_max"] >= 0.05
+    for connection in held:
+        connection.close()
+
+
+def test_get_internal_pool():
+    response = client.get("/internal/pool")
+    assert response.status_code == 200
+    assert "class" in response.json()["sync"]
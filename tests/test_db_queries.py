@@ -0,0 +1,64 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from config import settings
+from sqlalchemy import create_engine
+
+from db.queries import select_candidate_orders, select_fitting_orders
+from db.schema import (
+    hours_values, metadata, tbl_orders, tbl_order_windows, window_values
+)
+from utils.time import IntervalSet
+
+DAY = IntervalSet([(0, 1439)])
+WEIGHTS = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5]
+
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(tbl_orders.insert(), [
+            dict(order_id=i, weight=w, region=1 + i % 2,
+                 **hours_values('delivery_hours', [(0, 1439)]))
+            for i, w in enumerate(WEIGHTS, 1)
+        ])
+        connection.execute(tbl_order_windows.insert(), [
+            w for i in range(1, len(WEIGHTS) + 1)
+            for w in window_values(i, [(0, 1439)])
+        ])
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def order_ids(query):
+    with engine.connect() as connection:
+        return [row['order_id'] for row in connection.execute(query)]
+
+
+def test_fitting_orders_are_the_prefix_within_capacity():
+    # weights 1, 1, 2, 3, 3 sum up to 10
+    assert order_ids(select_fitting_orders([1, 2], 10, DAY)) == [2, 4, 7, 1, 10]
+
+
+def test_fitting_orders_include_min_count_lightest():
+    lightest = sorted(range(1, len(WEIGHTS) + 1), key=lambda i: (WEIGHTS[i - 1], i))
+    assert order_ids(select_fitting_orders([1, 2], 10, DAY, 7)) == lightest[:7]
+    assert sorted(order_ids(select_fitting_orders([1, 2], 10, DAY, 100))) == \
+        sorted(order_ids(select_candidate_orders([1, 2], 10, DAY)))
+
+
+def test_fitting_orders_respect_regions_and_weight():
+    # region 1: weights 1, 1, 9, 6, 3 (ids 2, 4, 6, 8, 10), 9 is too heavy
+    assert order_ids(select_fitting_orders([1], 8, DAY)) == [2, 4, 10]
+
+
+def test_fitting_orders_ranked_without_excluded():
+    # without 2 (weight 1) the next of weight 4 does not fit any more
+    assert order_ids(select_fitting_orders([1, 2], 10, DAY, 0, {2})) == [4, 7, 1, 10]
@@ -0,0 +1,66 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine
+
+from db.reconcile import reconcile_earnings
+from db.schema import metadata, tbl_couriers
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+COMPLETE_TIME = "2021-01-10T10:33:01.42Z"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def test_earnings_kept_on_completion():
+    client.post("/couriers", json={"data": [
+        {"courier_id": 1, "courier_type": "bike", "regions": [1],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    client.post("/orders", json={"data": [
+        {"order_id": i, "weight": 1, "region": 1,
+         "delivery_hours": ["00:00-23:59"]} for i in (1, 2)
+    ]})
+    assert client.post("/orders/assign", json={"courier_id": 1}).status_code == 200
+
+    for order_id in (1, 2, 2):
+        response = client.post("/orders/complete", json={
+            "courier_id": 1, "order_id": order_id,
+            "complete_time": COMPLETE_TIME})
+        assert response.status_code == 200
+        # not earned until the whole delivery is completed
+        expected = 0 if order_id == 1 else 5 * 500
+        assert client.get("/couriers/1").json()["earnings"] == expected
+
+    with engine.connect() as connection:
+        assert reconcile_earnings(connection) == []
+
+
+def test_reconcile_drift():
+    with engine.begin() as connection:
+        connection.execute(tbl_couriers.update().values(
+            earnings=1, completed_deliveries=7))
+
+    with engine.begin() as connection:
+        assert reconcile_earnings(connection, fix=True) == [{
+            "courier_id": 1, "earnings": 1, "completed_deliveries": 7,
+            "rebuilt_earnings": 2500, "rebuilt_deliveries": 1
+        }]
+    with engine.connect() as connection:
+        assert reconcile_earnings(connection) == []
+    assert client.get("/couriers/1").json()["earnings"] == 2500
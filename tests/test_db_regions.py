@@ -0,0 +1,60 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine, select
+
+from db.db import run_in_transaction
+from db.dispatch import dispatch_pending_orders
+from db.regions import get_region_index, load_region_index
+from db.schema import metadata, tbl_courier_regions
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    run_in_transaction(load_region_index)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def stored_regions():
+    with engine.connect() as connection:
+        return sorted(tuple(row) for row in connection.execute(
+            select([tbl_courier_regions])))
+
+
+def test_kept_in_sync():
+    client.post("/couriers", json={"data": [
+        {"courier_id": i, "courier_type": "car", "regions": [i, i, 10],
+         "working_hours": ["00:00-23:59"]} for i in (1, 2)
+    ]})
+    assert stored_regions() == [(1, 1), (1, 10), (2, 2), (2, 10)]
+
+    response = client.patch("/couriers/1", json={"regions": [3, 10]})
+    assert response.json()["regions"] == [3, 10]
+    assert stored_regions() == [(1, 3), (1, 10), (2, 2), (2, 10)]
+
+    index = run_in_transaction(get_region_index)
+    assert index.couriers([10]) == {1, 2}
+    assert index.couriers([1, 3]) == {1}
+
+
+def test_dispatch_takes_couriers_of_pending_regions():
+    client.post("/orders", json={"data": [
+        {"order_id": 1, "weight": 1, "region": 2,
+         "delivery_hours": ["00:00-23:59"]}
+    ]})
+    metrics = run_in_transaction(dispatch_pending_orders)
+    assert metrics["idle_couriers"] == 1
+    assert metrics["assigned_orders"] == 1
@@ -0,0 +1,74 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from db.db import after_commit, engine
+from db.schema import tbl_couriers
+from db.unit_of_work import UnitOfWork, UnitOfWorkRoute, get_unit_of_work
+
+app = FastAPI()
+app.router.route_class = UnitOfWorkRoute
+client = TestClient(app, raise_server_exceptions=False)
+committed = []
+
+
+def insert_courier(connection, courier_id: int):
+    connection.execute(tbl_couriers.insert(), {
+        "courier_id": courier_id,
+        "courier_type": "foot",
+        "regions": [1],
+        "working_hours": []
+    })
+    after_commit(connection, lambda: committed.append(courier_id))
+
+
+def fail(connection):
+    raise RuntimeError()
+
+
+@app.post("/couriers/{courier_id}")
+async def route_insert(courier_id: int, uow: UnitOfWork = Depends(get_unit_of_work)):
+    await uow.run(insert_courier, courier_id)
+    return {}
+
+
+@app.post("/couriers/{courier_id}/fail")
+async def route_insert_and_fail(courier_id: int, uow: UnitOfWork = Depends(get_unit_of_work)):
+    await uow.run(insert_courier, courier_id)
+    await uow.run(fail)
+    return {}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    from db.schema import metadata
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def courier_ids():
+    with engine.connect() as connection:
+        return [row[0] for row in connection.execute(
+            select([tbl_couriers.c.courier_id]))]
+
+
+def test_commit_before_response():
+    response = client.post("/couriers/1")
+    assert response.status_code == 200
+    assert courier_ids() == [1]
+    assert committed == [1]
+
+
+def test_rollback_on_error():
+    response = client.post("/couriers/2/fail")
+    assert response.status_code == 500
+    assert courier_ids() == [1]
+    assert committed == [1]
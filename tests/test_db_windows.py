@@ -0,0 +1,70 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+from config import settings
+from sqlalchemy import create_engine, select
+
+from db.queries import select_candidate_orders
+from db.schema import metadata, tbl_order_windows, window_values
+from utils.time import IntervalSet
+
+client = TestClient(app)
+engine = create_engine(settings.database_url)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def stored_windows():
+    with engine.connect() as connection:
+        return sorted(tuple(row) for row in connection.execute(
+            select([tbl_order_windows])))
+
+
+def candidate_ids(working_hours: IntervalSet):
+    with engine.connect() as connection:
+        return sorted(row['order_id'] for row in connection.execute(
+            select_candidate_orders([1], 50, working_hours)))
+
+
+def test_window_values_are_normalized():
+    assert window_values(1, [(600, 660), (630, 720), (800, 800)]) == [
+        {"order_id": 1, "start_min": 600, "end_min": 720}]
+    assert [(w["start_min"], w["end_min"]) for w in window_values(1, [(1380, 60)])] == \
+        [(0, 60), (1380, 1440)]
+
+
+def test_stored_at_ingest():
+    client.post("/orders", json={"data": [
+        {"order_id": 1, "weight": 1, "region": 1,
+         "delivery_hours": ["10:00-10:07", "23:00-01:00"]},
+        {"order_id": 2, "weight": 1, "region": 1,
+         "delivery_hours": ["10:10-11:00"]},
+    ]})
+    # a repeated id keeps the windows of the order stored first
+    client.post("/orders", json={"data": [
+        {"order_id": 2, "weight": 1, "region": 1,
+         "delivery_hours": ["12:00-13:00"]},
+    ]})
+    assert stored_windows() == [
+        (1, 0, 60), (1, 600, 607), (1, 1380, 1440), (2, 610, 660)]
+
+
+def test_candidates_overlap_exactly():
+    # both orders share the 10:00-10:15 slot with the courier, the first
+    # one is over before the courier starts
+    assert candidate_ids(IntervalSet([(608, 612)])) == [2]
+    assert candidate_ids(IntervalSet([(605, 608)])) == [1]
+    assert candidate_ids(IntervalSet([(660, 1380)])) == []
+    assert candidate_ids(IntervalSet([(30, 90), (650, 700)])) == [1, 2]
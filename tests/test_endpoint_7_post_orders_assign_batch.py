@@ -0,0 +1,149 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    from config import settings
+    from db.schema import metadata
+    from sqlalchemy import create_engine
+    engine = create_engine(settings.database_url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def test_post_couriers_good():
+    response = client.post("/couriers",
+        json={
+            "data": [
+                {
+                    "courier_id": 1,
+                    "courier_type": "foot",
+                    "regions": [1],
+                    "working_hours": ["00:00-23:59"]
+                },
+                {
+                    "courier_id": 2,
+                    "courier_type": "bike",
+                    "regions": [1, 2],
+                    "working_hours": ["00:00-23:59"]
+                },
+                {
+                    "courier_id": 3,
+                    "courier_type": "car",
+                    "regions": [1, 2],
+                    "working_hours": []
+                }
+            ]
+        },
+    )
+    assert response.status_code == 201
+
+
+def test_post_orders_good():
+    response = client.post("/orders",
+        json={
+            "data": [
+                {
+                    "order_id": 10,
+                    "weight": 6,
+                    "region": 1,
+                    "delivery_hours": ["00:00-23:59"]
+                },
+                {
+                    "order_id": 11,
+                    "weight": 5,
+                    "region": 1,
+                    "delivery_hours": ["00:00-23:59"]
+                },
+                {
+                    "order_id": 12,
+                    "weight": 14,
+                    "region": 2,
+                    "delivery_hours": ["00:00-23:59"]
+                },
+                {
+                    "order_id": 13,
+                    "weight": 3,
+                    "region": 1,
+                    "delivery_hours": ["00:00-23:59"]
+                }
+            ]
+        },
+    )
+    assert response.status_code == 201
+
+
+def test_bad_post_assign_batch_empty_list():
+    response = client.post("/orders/assign/batch",
+        json={
+            "courier_ids": []
+        }
+    )
+    assert response.status_code == 400
+
+
+def test_bad_post_assign_batch_nonexistent_courier():
+    response = client.post("/orders/assign/batch",
+        json={
+            "courier_ids": [1, 123456789]
+        }
+    )
+    assert response.status_code == 400
+
+    # nothing has been assigned
+    response = client.post("/orders/assign/batch",
+        json={
+            "courier_ids": [3]
+        }
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "couriers": [
+            {"courier_id": 3, "orders": []}
+        ]
+    }
+
+
+def test_good_post_assign_batch():
+    response = client.post("/orders/assign/batch",
+        json={
+            "courier_ids": [1, 2, 3]
+        }
+    )
+    assert response.status_code == 200
+    couriers = response.json()['couriers']
+    assert [e['courier_id'] for e in couriers] == [1, 2, 3]
+    # foot courier (10 kg) takes two lightest-fitting orders of region 1,
+    # bike courier (15 kg) gets the rest that fits
+    assert couriers[0]['orders'] == [{"id": 10}, {"id": 13}]
+    assert couriers[1]['orders'] == [{"id": 12}]
+    assert couriers[2] == {"courier_id": 3, "orders": []}
+    assert couriers[0]['assign_time'] == couriers[1]['assign_time']
+
+
+def test_good_post_assign_batch_again_returns_same_deliveries():
+    first = client.post("/orders/assign/batch",
+        json={
+            "courier_ids": [2, 1]
+        }
+    ).json()['couriers']
+    single = client.post("/orders/assign",
+        json={
+            "courier_id": 1
+        }
+    ).json()
+    assert [e['courier_id'] for e in first] == [2, 1]
+    assert first[0]['orders'] == [{"id": 12}]
+    assert first[1]['orders'] == single['orders'] == [{"id": 10}, {"id": 13}]
+    assert first[1]['assign_time'] == single['assign_time']
@@ -0,0 +1,84 @@
+import sys
+sys.path.append("../app")
+
+import json
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+
+client = TestClient(app)
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    from config import settings
+    from db.schema import metadata
+    from sqlalchemy import create_engine
+    engine = create_engine(settings.database_url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    # several chunks per upload
+    chunk_size, settings.ingest_chunk_size = settings.ingest_chunk_size, 2
+    yield
+    settings.ingest_chunk_size = chunk_size
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def ndjson(items):
+    return "\n".join(x if isinstance(x, str) else json.dumps(x) for x in items)
+
+
+def test_post_couriers_ndjson():
+    courier = {"courier_type": "car", "regions": [1], "working_hours": ["00:00-23:59"]}
+    response = client.post("/couriers", headers=NDJSON, data=ndjson([
+        dict(courier, courier_id=1),
+        dict(courier, courier_id=2),
+        dict(courier, courier_id=3, courier_type="plane"),
+        "{not json",
+        "",
+        dict(courier, courier_id=2),
+        dict(courier, courier_id=4),
+        dict(courier, courier_id=5),
+    ]))
+    assert response.status_code == 201
+    assert response.json() == {
+        "couriers": [{"id": 1}, {"id": 2}, {"id": 4}, {"id": 5}],
+        "validation_error": {"couriers": [{"id": 3}, {"line": 4}, {"id": 2}]}
+    }
+
+
+def test_post_couriers_ndjson_existing_are_rejected():
+    response = client.post("/couriers", headers=NDJSON, data=ndjson([
+        {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": []},
+    ]))
+    assert response.status_code == 201
+    assert response.json() == {
+        "couriers": [],
+        "validation_error": {"couriers": [{"id": 1}]}
+    }
+
+
+def test_post_orders_ndjson_then_assign():
+    response = client.post("/orders", headers=NDJSON, data=ndjson([
+        {"order_id": i, "weight": 1, "region": 1, "delivery_hours": ["00:00-23:59"]}
+        for i in range(1, 6)
+    ]) + "\n")
+    assert response.status_code == 201
+    assert response.json()["orders"] == [{"id": i} for i in range(1, 6)]
+
+    response = client.post("/orders/assign", json={"courier_id": 1})
+    assert response.status_code == 200
+    assert [x["id"] for x in response.json()["orders"]] == [1, 2, 3, 4, 5]
+
+
+def test_post_orders_json_still_works():
+    response = client.post("/orders", json={"data": [
+        {"order_id": 10, "weight": 1, "region": 1, "delivery_hours": ["00:00-23:59"]}
+    ]})
+    assert response.status_code == 201
+    assert response.json() == {"orders": [{"id": 10}]}
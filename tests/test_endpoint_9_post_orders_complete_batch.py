@@ -0,0 +1,77 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from fastapi.testclient import TestClient
+from main import app
+
+
+client = TestClient(app)
+
+COMPLETE_TIME = "2021-01-10T10:33:01.42Z"
+
+@pytest.fixture(scope="module", autouse=True)
+def clean_db():
+    from config import settings
+    from db.schema import metadata
+    from sqlalchemy import create_engine
+    engine = create_engine(settings.database_url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def completion(courier_id, order_id):
+    return {"courier_id": courier_id, "order_id": order_id,
+            "complete_time": COMPLETE_TIME}
+
+
+def test_assign():
+    client.post("/couriers", json={"data": [
+        {"courier_id": 1, "courier_type": "foot", "regions": [1],
+         "working_hours": ["00:00-23:59"]},
+        {"courier_id": 2, "courier_type": "car", "regions": [2],
+         "working_hours": ["00:00-23:59"]}
+    ]})
+    client.post("/orders", json={"data": [
+        {"order_id": i, "weight": 1, "region": 1 if i < 4 else 2,
+         "delivery_hours": ["00:00-23:59"]} for i in range(1, 6)
+    ]})
+    response = client.post("/orders/assign/batch", json={"courier_ids": [1, 2]})
+    assert response.status_code == 200
+
+
+def test_bad_request():
+    for body in ({}, {"data": []}, {"data": [completion(1, 1)], "x": 1},
+                 {"data": [dict(completion(1, 1), complete_time="now")]}):
+        response = client.post("/orders/complete/batch", json=body)
+        assert response.status_code == 400
+
+
+def test_complete_batch():
+    pairs = [(1, 1), (1, 1), (2, 1), (1, 99), (2, 4), (1, 2), (1, 3)]
+    response = client.post("/orders/complete/batch", json={
+        "data": [completion(*x) for x in pairs]})
+    assert response.status_code == 200
+    assert response.json() == {"orders": [
+        {"courier_id": courier_id, "order_id": order_id, "status_code": code}
+        for (courier_id, order_id), code in zip(
+            pairs, [200, 200, 400, 400, 200, 200, 200])
+    ]}
+    # courier 1 has finished the delivery, courier 2 has order 5 left
+    assert client.get("/couriers/1").json()["earnings"] == 2 * 500
+    assert client.get("/couriers/2").json()["earnings"] == 0
+
+
+def test_complete_batch_again():
+    response = client.post("/orders/complete/batch", json={
+        "data": [completion(1, 3), completion(2, 5)]})
+    assert [x["status_code"] for x in response.json()["orders"]] == [200, 200]
+    # as a single completion does
+    response = client.post("/orders/complete", json=completion(2, 5))
+    assert response.json() == {"order_id": 5}
+    assert client.get("/couriers/1").json()["earnings"] == 2 * 500
+    assert client.get("/couriers/2").json()["earnings"] == 9 * 500
@@ -0,0 +1,33 @@
+import sys
+sys.path.append("../app")
+
+from decimal import Decimal
+
+import pytest
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import FastJSONResponse
+from schemas.couriers import CourierItem, CourierTypeEnum
+
+
+@pytest.mark.parametrize("content", [
+    None,
+    {"orders": [{"id": 1}, {"id": 22}],
+     "assign_time": "2021-03-28T16:48:42.017Z"},
+    {"courier_id": 2, "courier_type": CourierTypeEnum.car, "regions": [1, 7],
+     "working_hours": ["09:00-18:00"], "rating": 4.93, "earnings": Decimal(4500)},
+    {"weight": Decimal("0.23"), "total": Decimal("10.10"), "ratio": 1 / 3},
+    {"validation_error": {"couriers": [], "name": "курьер"}},
+])
+def test_same_as_json_response(content):
+    assert FastJSONResponse(content).body == \
+        JSONResponse(jsonable_encoder(content)).body
+
+
+def test_model_dict_same_as_json_response():
+    courier = CourierItem(courier_id=1, courier_type="foot", regions=[3],
+                          working_hours=["09:00-11:00", "22:00-02:00"])
+    assert FastJSONResponse(courier.dict()).body == \
+        JSONResponse(jsonable_encoder(courier)).body
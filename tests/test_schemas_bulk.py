@@ -0,0 +1,82 @@
+import sys
+sys.path.append("../app")
+
+from decimal import Decimal
+
+import pytest
+
+from schemas.bulk import (
+    courier_row,
+    fast_courier_row,
+    fast_order_row,
+    model_row,
+    order_row,
+    validate_couriers,
+    validate_orders
+)
+from schemas.couriers import CourierItem
+from schemas.orders import OrderItem
+
+COURIER = {"courier_id": 1, "courier_type": "bike", "regions": [1, 22],
+           "working_hours": ["09:00-12:00", "22:00-02:00"]}
+ORDER = {"order_id": 1, "weight": 0.23, "region": 12,
+         "delivery_hours": ["09:00-18:00"]}
+
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"courier_id": "5"},
+    {"courier_id": True},
+    {"courier_id": 0},
+    {"courier_type": "plane"},
+    {"courier_type": 1},
+    {"regions": [1, -2]},
+    {"regions": 1},
+    {"regions": []},
+    {"working_hours": ["09:00-24:00"]},
+    {"working_hours": [900]},
+    {"working_hours": "09:00-12:00"},
+    {"extra": 1},
+])
+def test_courier_row_as_model(changes):
+    item = dict(COURIER, **changes)
+    assert courier_row(item) == model_row(CourierItem, item)
+
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"weight": 50},
+    {"weight": 0.01},
+    {"weight": 0.001},
+    {"weight": 50.01},
+    {"weight": "1.5"},
+    {"weight": float("nan")},
+    {"weight": None},
+    {"region": 0},
+    {"delivery_hours": []},
+    {"delivery_hours": ["9:00-18:00"]},
+])
+def test_order_row_as_model(changes):
+    item = dict(ORDER, **changes)
+    assert order_row(item) == model_row(OrderItem, item)
+
+
+def test_fast_path():
+    assert fast_courier_row(COURIER) is not None
+    assert fast_order_row(ORDER)["weight"] == Decimal("0.23")
+    # coercible values are left to the model
+    assert fast_courier_row(dict(COURIER, courier_id="5")) is None
+    assert courier_row(dict(COURIER, courier_id="5"))["courier_id"] == 5
+
+
+def test_validate_bulk():
+    rows, bad_ids = validate_couriers({"data": [
+        COURIER, dict(COURIER, courier_id=2, regions=[0]), {"courier_id": 3}
+    ]})
+    assert [x["courier_id"] for x in rows] == [1]
+    assert bad_ids == [2, 3]
+
+    for body in ([], {}, {"data": 1}, {"data": [], "x": 1},
+                 {"data": [ORDER, {"weight": 1}]}):
+        with pytest.raises(ValueError):
+            validate_orders(body)
@@ -0,0 +1,61 @@
+import sys
+sys.path.append("../app")
+
+from utils.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = LRUCache(2, 10)
+    for key in (1, 2):
+        cache.put(key, str(key), cache.token())
+    assert cache.get(1) == "1"
+    cache.put(3, "3", cache.token())
+    # 2 is the least recently used one
+    assert cache.get(2) is None
+    assert cache.get(1) == "1" and cache.get(3) == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl():
+    clock = Clock()
+    cache = LRUCache(10, 5, clock)
+    cache.put(1, "1", cache.token())
+    clock.now = 4.9
+    assert cache.get(1) == "1"
+    clock.now = 5
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = LRUCache(10, 10)
+    token = cache.token()
+    # a write invalidates the key while the reader fetches the old value
+    cache.invalidate([1])
+    cache.put(1, "old", token)
+    assert cache.get(1) is None
+    assert cache.stats()["rejected"] == 1
+
+    # the other keys and the later readers are not affected
+    cache.put(2, "2", token)
+    cache.put(1, "new", cache.token())
+    assert cache.get(1) == "new" and cache.get(2) == "2"
+
+
+def test_forgotten_invalidations():
+    cache = LRUCache(2, 10)
+    token = cache.token()
+    cache.invalidate([1, 2, 3])
+    # the invalidation of 1 is not tracked any more, the put is dropped
+    # all the same
+    cache.put(1, "old", token)
+    assert cache.get(1) is None
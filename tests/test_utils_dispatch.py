@@ -0,0 +1,36 @@
+import sys
+sys.path.append("../app")
+
+from utils.dispatch import DispatchCourier, DispatchOrder, solve
+from utils.time import IntervalSet
+
+DAY = IntervalSet([(0, 1439)])
+
+
+def test_broad_courier_leaves_orders_to_the_narrow_one():
+    # the broad courier comes first, but can serve region 2 only
+    broad = DispatchCourier(1, 1000, [1, 2], DAY)
+    narrow = DispatchCourier(2, 1000, [1], DAY)
+    orders = [
+        DispatchOrder(10, 600, 1, DAY),
+        DispatchOrder(11, 600, 2, DAY),
+    ]
+    assert solve([broad, narrow], orders) == {1: [11], 2: [10]}
+
+
+def test_capacity_region_and_time_are_respected():
+    courier = DispatchCourier(1, 1000, [1], IntervalSet([(540, 600)]))
+    orders = [
+        DispatchOrder(10, 400, 1, DAY),
+        DispatchOrder(11, 500, 1, DAY),
+        DispatchOrder(12, 300, 1, DAY),
+        DispatchOrder(13, 100, 2, DAY),
+        DispatchOrder(14, 100, 1, IntervalSet([(600, 700)])),
+    ]
+    result = solve([courier], orders)
+    assert sorted(result[1]) == [10, 12]
+
+
+def test_nothing_to_dispatch():
+    assert solve([], [DispatchOrder(10, 100, 1, DAY)]) == {}
+    assert solve([DispatchCourier(1, 1000, [1], DAY)], []) == {}
@@ -0,0 +1,51 @@
+import sys
+sys.path.append("../app")
+
+from utils.lag import LagMeter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lag_from_the_oldest_event():
+    clock = Clock()
+    meter = LagMeter(clock)
+    meter.event()
+    clock.now = 2.0
+    meter.event()
+    assert meter.stats()["waiting"] == 2.0
+
+    since = meter.begin()
+    # taken by the next pass
+    clock.now = 3.0
+    meter.event()
+    clock.now = 5.0
+    meter.done(since)
+    stats = meter.stats()
+    assert stats["last"] == 5.0 and stats["count"] == 1
+    assert stats["waiting"] == 2.0
+
+
+def test_failed_pass_keeps_the_events():
+    clock = Clock()
+    meter = LagMeter(clock)
+    meter.event()
+    since = meter.begin()
+    clock.now = 1.0
+    meter.event()
+    meter.failed(since)
+    clock.now = 4.0
+    meter.done(meter.begin())
+    assert meter.stats()["last"] == 4.0
+
+
+def test_pass_without_events():
+    meter = LagMeter()
+    meter.done(meter.begin())
+    assert meter.stats() == {
+        "count": 0, "last": None, "max": 0.0, "mean": None, "waiting": None}
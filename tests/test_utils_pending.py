@@ -0,0 +1,50 @@
+import sys
+sys.path.append("../app")
+
+from decimal import Decimal
+
+from utils.pending import PendingIndex, PendingOrder
+from utils.time import IntervalSet
+
+DAY = IntervalSet([(0, 1439)])
+
+
+def ids(orders):
+    return [order.order_id for order in orders]
+
+
+def test_candidates_are_filtered_and_sorted_by_weight():
+    index = PendingIndex()
+    index.add([
+        PendingOrder(1, Decimal('5'), 1, DAY),
+        PendingOrder(2, Decimal('0.5'), 2, DAY),
+        PendingOrder(3, Decimal('2'), 1, DAY),
+        PendingOrder(4, Decimal('11'), 1, DAY),
+        PendingOrder(5, Decimal('1'), 3, DAY),
+        PendingOrder(6, Decimal('1'), 1, IntervalSet([(600, 700)])),
+    ])
+    assert ids(index.candidates([1, 2], 10, IntervalSet([(540, 600)]))) == [2, 3, 1]
+    assert ids(index.candidates([1], 10, DAY)) == [6, 3, 1]
+
+
+def test_add_replaces_and_discard_removes():
+    index = PendingIndex()
+    index.add([PendingOrder(1, 5, 1, DAY), PendingOrder(2, 3, 1, DAY)])
+    index.add([PendingOrder(1, 1, 2, DAY)])
+    assert ids(index.candidates([1], 50, DAY)) == [2]
+    assert ids(index.candidates([2], 50, DAY)) == [1]
+
+    index.discard([1, 2, 3])
+    assert len(index) == 0
+    assert index.candidates([1, 2], 50, DAY) == []
+
+
+def test_reset_keeps_orders_added_after_the_mark():
+    index = PendingIndex()
+    index.add([PendingOrder(1, 1, 1, DAY)])
+    mark = index.mark()
+    # posted while the snapshot (which has not got it) was being read
+    index.add([PendingOrder(2, 1, 1, DAY)])
+    index.reset([PendingOrder(3, 1, 1, DAY)], mark)
+    assert index.loaded
+    assert sorted(ids(index.candidates([1], 50, DAY))) == [2, 3]
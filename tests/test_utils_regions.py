@@ -0,0 +1,28 @@
+import sys
+sys.path.append("../app")
+
+from utils.regions import RegionIndex
+
+
+def test_set_regions():
+    index = RegionIndex()
+    index.set_regions([(1, [1, 2]), (2, [2, 3])])
+    assert index.couriers([2]) == {1, 2}
+    assert index.couriers([1, 3, 4]) == {1, 2}
+    index.set_regions([(1, [3])])
+    assert index.couriers([1]) == set()
+    assert index.couriers([3]) == {1, 2}
+    assert index.regions(1) == {3}
+
+
+def test_reset_keeps_recent_changes():
+    index = RegionIndex()
+    index.set_regions([(1, [1])])
+    mark = index.mark()
+    # committed after the snapshot has been read
+    index.set_regions([(2, [5]), (1, [4])])
+    index.reset([(1, 1), (3, 1), (3, 2)], mark)
+    assert index.loaded
+    assert index.couriers([1]) == {3}
+    assert index.couriers([4, 5]) == {1, 2}
+    assert len(index) == 3
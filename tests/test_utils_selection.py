@@ -0,0 +1,38 @@
+import sys
+sys.path.append("../app")
+
+from config import AssignObjectiveEnum
+from utils.selection import select_greedy, select_knapsack, to_centikilos
+
+
+def test_to_centikilos():
+    assert to_centikilos(0.29) == 29
+    assert to_centikilos(50) == 5000
+
+
+def test_greedy_stops_at_first_overflow():
+    assert select_greedy([100, 300, 400, 700], 1000) == [0, 1, 2]
+    assert select_greedy([1100], 1000) == []
+
+
+def test_knapsack_takes_everything_that_fits():
+    assert select_knapsack([100, 200], 1000) == [0, 1]
+
+
+def test_knapsack_count_objective_fills_unused_capacity():
+    weights = [100, 300, 400, 550]
+    # greedy: 100 + 300 + 400 = 800, same count with more weight: 950
+    chosen = select_knapsack(weights, 1000, AssignObjectiveEnum.count)
+    assert chosen == [0, 1, 3]
+
+
+def test_knapsack_weight_objective():
+    weights = [100, 300, 400, 550, 1100]
+    chosen = select_knapsack(weights, 1000, AssignObjectiveEnum.weight)
+    assert sum(weights[i] for i in chosen) == 950
+
+
+def test_knapsack_falls_back_to_greedy():
+    weights = [100, 300, 400, 700]
+    assert select_knapsack(weights, 1000, max_candidates=3) == [0, 1, 2]
+    assert select_knapsack(weights, 1000, time_budget=-1) == [0, 1, 2]
@@ -0,0 +1,85 @@
+import sys
+sys.path.append("../app")
+
+import pytest
+
+from utils.time import (
+    IntervalSet, TimeInterval, can_be_delivered_in_time, dump_hours,
+    format_hours
+)
+
+
+def test_time_interval_parse():
+    interval = TimeInterval.parse("09:05-23:59")
+    assert (interval.start, interval.end) == (545, 1439)
+    assert str(interval) == "09:05-23:59"
+
+
+@pytest.mark.parametrize("hours", [
+    "9:05-23:59", "09:05-24:00", "09:60-10:00", "09:00 - 10:00", "", "09:00"
+])
+def test_time_interval_parse_bad_input(hours):
+    with pytest.raises(ValueError):
+        TimeInterval.parse(hours)
+
+
+def test_hours_storage_roundtrip():
+    hours = ["16:35-23:45", "09:00-11:00"]
+    stored = dump_hours(TimeInterval.parse(x) for x in hours)
+    assert stored == [[995, 1425], [540, 660]]
+    assert format_hours(stored) == hours
+    assert IntervalSet(stored) == IntervalSet.from_strings(hours)
+
+
+def test_interval_set_is_sorted_and_merged():
+    hours = IntervalSet.from_strings(
+        ["11:35-14:05", "09:00-11:00", "10:30-11:35", "12:00-12:30"])
+    assert list(hours) == [(540, 845)]
+
+
+def test_interval_set_drops_empty_and_splits_wrapping():
+    hours = IntervalSet.from_strings(["10:00-10:00", "23:00-01:00"])
+    assert list(hours) == [(0, 60), (1380, 1440)]
+
+
+def test_interval_set_clip():
+    hours = IntervalSet.from_strings(["09:00-11:00", "16:35-23:45"])
+    assert list(hours.clip(600)) == [(600, 660), (995, 1425)]
+    assert list(hours.clip(660)) == [(995, 1425)]
+    assert not hours.clip(1425)
+
+
+def test_interval_set_overlaps():
+    courier = IntervalSet.from_strings(["09:00-11:00", "16:35-23:45"])
+    assert courier.overlaps(IntervalSet.from_strings(["10:59-11:30"]))
+    assert courier.overlaps(IntervalSet.from_strings(["12:00-13:00", "23:00-23:58"]))
+    assert not courier.overlaps(IntervalSet.from_strings(["11:00-16:35"]))
+    assert not courier.overlaps(IntervalSet.from_strings(["23:45-23:58"]))
+    assert not courier.overlaps(IntervalSet())
+
+
+def test_can_be_delivered_in_time():
+    courier_hours = ["11:35-14:08", "09:00-11:05"]
+    delivery_hours = ["14:05-14:35", "11:00-11:35"]
+    assert can_be_delivered_in_time('11:04', courier_hours, delivery_hours)
+    assert can_be_delivered_in_time('14:07', courier_hours, delivery_hours)
+    assert not can_be_delivered_in_time('14:08', courier_hours, delivery_hours)
+    assert not can_be_delivered_in_time('11:05', courier_hours, ["11:00-11:35"])
+
+
+def test_interval_set_slot_masks():
+    assert IntervalSet().slot_masks() == (0, 0)
+    # 00:00-00:15 is slot 0, 11:45-12:01 touches slots 47 and 48
+    assert IntervalSet.from_strings(["00:00-00:15"]).slot_masks() == (1, 0)
+    assert IntervalSet.from_strings(["11:45-12:01"]).slot_masks() == (1 << 47, 1)
+    assert IntervalSet.from_strings(["23:50-23:59"]).slot_masks() == (0, 1 << 47)
+
+
+def test_interval_set_slot_masks_never_miss_an_overlap():
+    courier = IntervalSet.from_strings(["09:00-11:07", "16:35-23:45"])
+    c_am, c_pm = courier.slot_masks()
+    for start in range(0, 1440, 7):
+        order = IntervalSet([(start, start + 5)])
+        o_am, o_pm = order.slot_masks()
+        if courier.overlaps(order):
+            assert (c_am & o_am) or (c_pm & o_pm)